@@ -8,11 +8,12 @@ from os import getenv
 from flask import Flask, make_response, jsonify
 from api.v1.views import app_views
 from flask_cors import CORS
-from models import storage
+from models import storage, storage_t
 
 app = Flask(__name__)
 CORS(app, resources={r"/api/v1/*": {"origins": "0.0.0.0"}})
 app.register_blueprint(app_views)
+debug_sql = storage_t == "db" and getenv('HBNB_API_DEBUG_SQL') == "1"
 
 
 @app.errorhandler(404)
@@ -21,6 +22,21 @@ def page_not_found(error):
     return make_response(jsonify({'error': 'Not found'}), 404)
 
 
+@app.after_request
+def sql_stats(response):
+    """Reports the SQL statements run so far by the request in the
+    X-SQL-Queries, X-SQL-Time and X-SQL-Slowest headers, in debug mode"""
+    if debug_sql:
+        stats = storage.query_stats()
+        response.headers["X-SQL-Queries"] = str(stats["queries"])
+        response.headers["X-SQL-Time"] = "{:.3f}ms".format(stats["time_ms"])
+        if stats["slowest"]:
+            slowest = stats["slowest"][0]
+            response.headers["X-SQL-Slowest"] = "{:.3f}ms {}".format(
+                slowest["time_ms"], slowest["statement"][:200])
+    return response
+
+
 @app.teardown_appcontext
 def teardown(self):
     """This closes the storage session in SQLAlchemy db"""
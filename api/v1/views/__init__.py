@@ -1,9 +1,34 @@
 #!/usr/bin/python3
 """Creates The Blueprint instance"""
-from flask import Blueprint
+from flask import Blueprint, Response, stream_with_context
+from itertools import islice
 
 app_views = Blueprint('app_views', __name__, url_prefix='/api/v1')
 
+
+def jsonify_list(objs):
+    """Returns a JSON array response joining the cached JSON of objs"""
+    body = b"[" + b",".join(obj.to_json() for obj in objs) + b"]\n"
+    return Response(body, mimetype="application/json")
+
+
+def stream_list(objs, batch_size=1000):
+    """Returns a JSON array response written batch_size objects at a time
+    as objs, typically storage.iter(), yields them"""
+    def generate():
+        objs_iter = iter(objs)
+        separator = b"["
+        while True:
+            batch = [obj.to_json() for obj in islice(objs_iter, batch_size)]
+            if not batch:
+                break
+            yield separator + b",".join(batch)
+            separator = b","
+        yield b"[]\n" if separator == b"[" else b"]\n"
+    return Response(stream_with_context(generate()),
+                    mimetype="application/json")
+
+
 from api.v1.views.index import *
 from api.v1.views.states import *
 from api.v1.views.cities import *
@@ -11,4 +36,5 @@ from api.v1.views.amenities import *
 from api.v1.views.users import *
 from api.v1.views.places import *
 from api.v1.views.places_reviews import *
-from api.v1.views.places_amenities import *
\ No newline at end of file
+from api.v1.views.places_amenities import *
+from api.v1.views.bulk import *
\ No newline at end of file
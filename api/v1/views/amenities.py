@@ -1,6 +1,6 @@
 #!/usr/bin/python3
 """Handles all CRUD operations for amenity objs"""
-from api.v1.views import app_views
+from api.v1.views import app_views, stream_list
 from models import storage
 from flask import jsonify, abort, make_response, request
 from models.amenity import Amenity
@@ -9,11 +9,7 @@ from models.amenity import Amenity
 @app_views.route('/amenities', methods=['GET'], strict_slashes=False)
 def all_amenities():
     """Returns all available amenities"""
-    dct_amenities = storage.all(Amenity)
-    amenities_list = []
-    for item in dct_amenities.values():
-        amenities_list.append(item.to_dict())
-    return jsonify(amenities_list)
+    return stream_list(storage.iter(Amenity))
 
 
 @app_views.route('/amenities/<amenity_id>',
@@ -0,0 +1,117 @@
+#!/usr/bin/python3
+"""Creates, updates and deletes objs in bulk"""
+from api.v1.views import app_views, jsonify_list
+from models import storage
+from flask import jsonify, abort, make_response, request
+from models.amenity import Amenity
+from models.city import City
+from models.place import Place
+from models.review import Review
+from models.state import State
+from models.user import User
+
+# resource: (class, required attributes, {parent id attribute: class})
+resources = {
+    "amenities": (Amenity, ["name"], {}),
+    "cities": (City, ["state_id", "name"], {"state_id": State}),
+    "places": (Place, ["city_id", "user_id", "name"],
+               {"city_id": City, "user_id": User}),
+    "reviews": (Review, ["place_id", "user_id", "text"],
+                {"place_id": Place, "user_id": User}),
+    "states": (State, ["name"], {}),
+    "users": (User, ["email", "password"], {})
+}
+# resource: attributes its PUT view leaves untouched besides id and dates
+ignored = {
+    "places": ["user_id", "city_id"],
+    "reviews": ["user_id", "place_id"],
+    "users": ["email"]
+}
+
+
+def get_resource(resource):
+    """Returns the entry of resources for resource or aborts with 404"""
+    if resource not in resources:
+        abort(404)
+    return resources[resource]
+
+
+def invalid(attr):
+    """Returns the 400 response for a value of attr that is not an id"""
+    return make_response(jsonify({"error": "Invalid {}".format(attr)}), 400)
+
+
+def missing_parents(parents, items):
+    """Tells if an id given for a parent attribute in items is unknown"""
+    for attr, parent in parents.items():
+        ids = set(item[attr] for item in items if attr in item)
+        if ids and len(storage.get_many(parent, ids)) != len(ids):
+            return True
+    return False
+
+
+def settable(cls, attr):
+    """Tells if attr can be set on the objects of cls, which read-only
+    properties such as State.cities in file storage cannot"""
+    value = getattr(cls, attr, None)
+    return not isinstance(value, property) or value.fset is not None
+
+
+@app_views.route('/bulk/<resource>', methods=['POST'], strict_slashes=False)
+def bulk_post(resource):
+    """Creates a list of objects with a single storage write"""
+    cls, required, parents = get_resource(resource)
+    req = request.get_json(silent=True)
+    if not isinstance(req, list) or \
+            not all(isinstance(item, dict) for item in req):
+        return make_response(jsonify({"error": "Not a JSON"}), 400)
+    for item in req:
+        for attr in required:
+            if attr not in item:
+                return make_response(
+                    jsonify({"error": "Missing {}".format(attr)}), 400)
+        for attr in parents:
+            if not isinstance(item[attr], str):
+                return invalid(attr)
+    if missing_parents(parents, req):
+        abort(404)
+    objs = [cls(**item) for item in req]
+    storage.bulk_new(objs)
+    return make_response(jsonify_list(objs), 201)
+
+
+@app_views.route('/bulk/<resource>', methods=['PUT'], strict_slashes=False)
+def bulk_put(resource):
+    """Updates objects given as {id: {attribute: value}} with a single
+    storage write"""
+    cls, required, parents = get_resource(resource)
+    req = request.get_json(silent=True)
+    if not isinstance(req, dict) or \
+            not all(isinstance(attrs, dict) for attrs in req.values()):
+        return make_response(jsonify({"error": "Not a JSON"}), 400)
+    skipped = ['id', 'created_at', 'updated_at'] + ignored.get(resource, [])
+    changes = {}
+    for id, attrs in req.items():
+        changes[id] = {key: value for key, value in attrs.items()
+                       if key not in skipped and settable(cls, key)}
+        for attr in parents:
+            if attr in changes[id] and \
+                    not isinstance(changes[id][attr], str):
+                return invalid(attr)
+    if missing_parents(parents, changes.values()):
+        abort(404)
+    return jsonify({"updated": storage.bulk_update(cls, changes)})
+
+
+@app_views.route('/bulk/<resource>', methods=['DELETE'],
+                 strict_slashes=False)
+def bulk_delete(resource):
+    """Deletes the objects whose ids are listed with a single storage
+    write"""
+    cls, required, parents = get_resource(resource)
+    req = request.get_json(silent=True)
+    if not isinstance(req, list):
+        return make_response(jsonify({"error": "Not a JSON"}), 400)
+    if not all(isinstance(id, str) for id in req):
+        return invalid("id")
+    return jsonify({"deleted": storage.bulk_delete(cls, req)})
@@ -1,6 +1,6 @@
 #!/usr/bin/python3
 """Create, Read, Update, and Delete methods for cities objs"""
-from api.v1.views import app_views
+from api.v1.views import app_views, jsonify_list
 from models import storage
 from flask import jsonify, abort, make_response, request
 from models.city import City
@@ -16,12 +16,7 @@ def get_cities(state_id):
         if dct_state is None:
             abort(404)
         else:
-            cities = storage.all(City).values()
-            cities_list = []
-            for city in cities:
-                if city.state_id == state_id:
-                    cities_list.append(city.to_dict())
-            return jsonify(cities_list)
+            return jsonify_list(storage.find(City, {"state_id": state_id}))
 
 
 @app_views.route('/cities/<city_id>', methods=['GET'],
@@ -2,8 +2,8 @@
 """
 Creates a route /status on the object app_views
 """
-from models import storage
-from flask import jsonify
+from models import storage, storage_t
+from flask import abort, jsonify
 from api.v1.views import app_views
 
 
@@ -18,11 +18,29 @@ def status():
 @app_views.route('/stats', methods=['GET'], strict_slashes=False)
 def stats():
     """Here, we retrieve the object number by type."""
+    counts = storage.counts(["Amenity", "City", "Place",
+                             "Review", "State", "User"])
     return jsonify({
-        "amenities": storage.count("Amenity"),
-        "cities": storage.count("City"),
-        "places": storage.count("Place"),
-        "reviews": storage.count("Review"),
-        "states": storage.count("State"),
-        "users": storage.count("User")
+        "amenities": counts["Amenity"],
+        "cities": counts["City"],
+        "places": counts["Place"],
+        "reviews": counts["Review"],
+        "states": counts["State"],
+        "users": counts["User"]
     })
+
+
+@app_views.route('/pool', methods=['GET'], strict_slashes=False)
+def pool():
+    """Returns the database connection pool statistics"""
+    if storage_t != "db":
+        abort(404)
+    return jsonify(storage.pool_stats())
+
+
+@app_views.route('/cache', methods=['GET'], strict_slashes=False)
+def cache():
+    """Returns the object cache statistics"""
+    if storage_t != "db":
+        abort(404)
+    return jsonify(storage.cache_stats())
@@ -1,13 +1,16 @@
 #!/usr/bin/python3
 """Viewing places in the storage"""
-from api.v1.views import app_views
+from api.v1.views import app_views, jsonify_list, stream_list
 from models import storage
 from flask import jsonify, abort, make_response, request
 from models.place import Place
 from models.city import City
 from models.user import User
-import json
-from os import getenv
+from models.engine.geo import coordinates
+
+# numeric Place attributes places_search filters on as
+# {"min": <low>, "max": <high>} and sorts by with order_by
+ranged = ("number_rooms", "number_bathrooms", "max_guest", "price_by_night")
 
 
 @app_views.route('/cities/<city_id>/places',
@@ -21,12 +24,26 @@ def get_places(city_id):
         if dct_city is None:
             abort(404)
         else:
-            places = storage.all(Place).values()
-            places_list = []
-            for place in places:
-                if place.city_id == city_id:
-                    places_list.append(place.to_dict())
-            return jsonify(places_list)
+            return jsonify_list(storage.find(Place, {"city_id": city_id}))
+
+
+@app_views.route('/places/clusters', methods=['GET'], strict_slashes=False)
+def get_place_clusters():
+    """Returns the number of places, their average price and one place
+    id for each map tile of zoom overlapping bbox, given as
+    ?bbox=<west>,<south>,<east>,<north>&zoom=<level>"""
+    try:
+        bbox = [float(value) for value in
+                request.args.get('bbox', '-180,-90,180,90').split(',')]
+    except ValueError:
+        abort(400, 'Invalid bbox')
+    if len(bbox) != 4 or coordinates(bbox[1], bbox[0]) is None or \
+            coordinates(bbox[3], bbox[2]) is None or bbox[1] > bbox[3]:
+        abort(400, 'Invalid bbox')
+    zoom = request.args.get('zoom', '0')
+    if not zoom.isdigit():
+        abort(400, 'Invalid zoom')
+    return jsonify(storage.clusters(tuple(bbox), int(zoom)))
 
 
 @app_views.route('/places/<place_id>', methods=['GET'], strict_slashes=False)
@@ -111,61 +128,71 @@ def update_place(place_id):
 def places_search():
     """Retrives all place instances based on the request"""
     body_req = request.get_json()
-    if body_req is None:
+    if type(body_req) is not dict:
         abort(400, 'Not a JSON')
 
-    if not body_req or (
+    limit = body_req.get('limit')
+    offset = body_req.get('offset', 0)
+    if limit is not None and (type(limit) is not int or limit < 0):
+        abort(400, 'Invalid limit')
+    if type(offset) is not int or offset < 0:
+        abort(400, 'Invalid offset')
+    for name in ('states', 'cities', 'amenities'):
+        ids = body_req.get(name)
+        if ids is not None and (type(ids) is not list or
+                                any(type(id) is not str for id in ids)):
+            abort(400, 'Invalid {}'.format(name))
+
+    ranges = {}
+    for attr in ranged:
+        if attr not in body_req:
+            continue
+        bounds = body_req[attr]
+        if type(bounds) is not dict or not set(bounds) <= {'min', 'max'} or \
+                any(type(bounds[b]) not in (int, float) for b in bounds):
+            abort(400, 'Invalid {}'.format(attr))
+        ranges[attr] = (bounds.get('min'), bounds.get('max'))
+    order_by = body_req.get('order_by')
+    if order_by is not None and (type(order_by) is not str or
+                                 order_by.lstrip('-') not in ranged or
+                                 order_by.count('-') > 1):
+        abort(400, 'Invalid order_by')
+
+    bbox = body_req.get('bbox')
+    if bbox is not None:
+        if type(bbox) is not list or len(bbox) != 4 or \
+                coordinates(bbox[1], bbox[0]) is None or \
+                coordinates(bbox[3], bbox[2]) is None or bbox[1] > bbox[3]:
+            abort(400, 'Invalid bbox')
+        bbox = tuple(bbox)
+    radius = body_req.get('radius')
+    if radius is not None:
+        if type(radius) is not dict or coordinates(
+                radius.get('latitude'), radius.get('longitude')) is None or \
+                type(radius.get('km')) not in (int, float) or \
+                not radius['km'] >= 0:
+            abort(400, 'Invalid radius')
+        radius = (radius['latitude'], radius['longitude'], radius['km'])
+    nearest = body_req.get('nearest')
+    if nearest is not None:
+        if type(nearest) is not dict or order_by is not None or \
+                type(nearest.get('place_id')) is not str or \
+                type(nearest.get('k')) is not int or nearest['k'] < 1:
+            abort(400, 'Invalid nearest')
+        nearest = (nearest['place_id'], nearest['k'])
+
+    if limit is None and not offset and not ranges and order_by is None and (
+            bbox is None and radius is None and nearest is None and
             not body_req.get('states') and
             not body_req.get('cities') and
             not body_req.get('amenities')
     ):
-        places = storage.all(Place)
-        return jsonify([place.to_dict() for place in places.values()])
-
-    places = []
-
-    if body_req.get('states'):
-        states = [storage.get("State", id) for id in body_req.get('states')]
-
-        for state in states:
-            for city in state.cities:
-                for place in city.places:
-                    places.append(place)
-
-    if body_req.get('cities'):
-        cities = [storage.get("City", id) for id in body_req.get('cities')]
-
-        for city in cities:
-            for place in city.places:
-                if place not in places:
-                    places.append(place)
-
-    if not places:
-        places = storage.all(Place)
-        places = [place for place in places.values()]
-
-    if body_req.get('amenities'):
-        amens = [storage.get("Amenity", id)
-                 for id in body_req.get('amenities')]
-        m = 0
-        limit = len(places)
-        HBNB_API_HOST = getenv('HBNB_API_HOST')
-        HBNB_API_PORT = getenv('HBNB_API_PORT')
-
-        port = 5000 if not HBNB_API_PORT else HBNB_API_PORT
-        first_url = "http://0.0.0.0:{}/api/vi/places/".format(port)
-        while m < limit:
-            place = places[m]
-            url = "{}/amenities".format(first_url, place.id)
-            req = url.format(place.id)
-            response = requests.get(req)
-            amen_dct = json.loads(response.text)
-            amenities = [storage.get("Amenity", k['id']) for k in amen_dct]
-            for amenity in amens:
-                if amenity not in amenities:
-                    places.pop(m)
-                    m -= 1
-                    limit -= 1
-                    break
-            m += 1
-    return jsonify([place.to_dict() for place in places])
+        return stream_list(storage.iter(Place))
+
+    places = storage.search_places(states=body_req.get('states'),
+                                   cities=body_req.get('cities'),
+                                   amenities=body_req.get('amenities'),
+                                   limit=limit, offset=offset,
+                                   ranges=ranges, order_by=order_by,
+                                   bbox=bbox, radius=radius, nearest=nearest)
+    return jsonify_list(places)
@@ -5,24 +5,19 @@ from models.amenity import Amenity
 from models import storage
 from os import environ
 from flask import abort, jsonify, make_response, request
-from api.v1.views import app_views
+from api.v1.views import app_views, jsonify_list
 
 
 @app_views.route('places/<place_id>/amenities', methods=['GET'],
                  strict_slashes=False)
 def get_place_amenities(place_id):
     """Retrives a list of all amenitied associated with place_id"""
-    place = storage.get(Place, place_id)
+    place = storage.get(Place, place_id, load=["amenities"])
 
     if not place:
         abort(404)
 
-    if environ.get('HBNB_TYPE_STORAGE') == "db":
-        amenities = [amenity.to_dict() for amenity in place.amenities]
-    else:
-        amenities = [storage.get(Amenity, Amenity_id).to_dict()
-                     for amenity_id in place.amenity_ids]
-    return jsonify(amenities)
+    return jsonify_list(place.amenities)
 
 
 @app_views.route('/places/<place_id>/amenities/<amenity_id>',
@@ -46,7 +41,8 @@ def delete_place_amenity(place_id, amenity_id):
     else:
         if amenity_id not in place.amenity_ids:
             abort(404)
-        place.amenity_ids.remove(amenity_id)
+        place.amenity_ids = [i for i in place.amenity_ids
+                             if i != amenity_id]
 
     storage.save()
     return make_response(jsonify({}), 200)
@@ -75,7 +71,7 @@ def post_place_amenity(place_id, amenity_id):
         if amenity_id in place.amenity_ids:
             return make_response(jsonify(amenity.to_dict()), 200)
         else:
-            place.amenity_ids.append(amenity_id)
+            place.amenity_ids = place.amenity_ids + [amenity_id]
 
     storage.save()
     return make_response(jsonify(amenity.to_dict()), 201)
@@ -1,6 +1,6 @@
 #!/usr/bin/python3
 """Viewing places in the storage"""
-from api.v1.views import app_views
+from api.v1.views import app_views, jsonify_list
 from models import storage
 from flask import jsonify, abort, make_response, request
 from models.place import Place
@@ -18,12 +18,8 @@ def get_reviews(place_id):
         if dct_place is None:
             abort(404)
         else:
-            reviews = storage.all(Review).values()
-            reviews_list = []
-            for review in reviews:
-                if review.place_id == place_id:
-                    reviews_list.append(review.to_dict())
-            return jsonify(reviews_list)
+            return jsonify_list(storage.find(Review,
+                                             {"place_id": place_id}))
 
 
 @app_views.route('reviews/<review_id>', methods=['GET'], strict_slashes=False)
@@ -1,6 +1,6 @@
 #!/usr/bin/python3
 """End point that handles all default RESTFul api actions for state objs"""
-from api.v1.views import app_views
+from api.v1.views import app_views, stream_list
 from flask import jsonify, abort, request, make_response
 from models import storage
 from models.state import State
@@ -9,11 +9,7 @@ from models.state import State
 @app_views.route('/states', methods=['GET'], strict_slashes=False)
 def all_states():
     """Retrieves the list of all state objects"""
-    dct_states = storage.all(State)
-    states = []
-    for state in dct_states.values():
-        states.append(state.to_dict())
-    return jsonify(states)
+    return stream_list(storage.iter(State))
 
 
 @app_views.route('/states/<state_id>', methods=['GET'], strict_slashes=False)
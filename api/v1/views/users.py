@@ -1,6 +1,6 @@
 #!/usr/bin/python3
 """View for User class"""
-from api.v1.views import app_views
+from api.v1.views import app_views, stream_list
 from models import storage
 from flask import jsonify, abort, make_response, request
 from models.user import User
@@ -9,11 +9,7 @@ from models.user import User
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def get_users():
     """Returns all users in the db"""
-    dct_users = storage.all(User)
-    users_list = []
-    for value in dct_users.values():
-        users_list = users_list.append(value.to_dict())
-    return jsonify(users_list)
+    return stream_list(storage.iter(User))
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
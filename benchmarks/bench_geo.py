@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+"""
+Times the FileStorage spatial searches and map clusters on places spread
+over a country, against a scan of every place
+usage: ./benchmarks/bench_geo.py [number of places]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIRECTORY = tempfile.TemporaryDirectory()
+os.environ.pop("HBNB_TYPE_STORAGE", None)
+os.chdir(DIRECTORY.name)
+sys.path.insert(0, ROOT)
+import models  # noqa: E402
+from models.engine.geo import distance  # noqa: E402
+from models.place import Place  # noqa: E402
+
+
+def populate(n_places):
+    """stores n_places places at random points of a 10 by 10 degree box"""
+    rand = random.Random(0)
+    places = [Place(name="Place {}".format(i),
+                    latitude=rand.uniform(-5, 5),
+                    longitude=rand.uniform(30, 40)) for i in range(n_places)]
+    for place in places:
+        models.storage.new(place)
+    return places
+
+
+def scan(latitude, longitude, km):
+    """returns the places within km of the point, checking each of them"""
+    return [place for place in models.storage.all(Place).values()
+            if distance(latitude, longitude,
+                        place.latitude, place.longitude) <= km]
+
+
+def timed(function, repeat=20):
+    """returns the best time of function over repeat runs, in ms"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+if __name__ == "__main__":
+    n_places = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    places = populate(n_places)
+    search = models.storage.search_places
+    named = [
+        ("radius 5 km", lambda: search(radius=(0.0, 35.0, 5))),
+        ("bbox 0.2 degree", lambda: search(bbox=(35.0, 0.0, 35.2, 0.2))),
+        ("10 nearest", lambda: search(nearest=(places[0].id, 10))),
+        ("clusters zoom 4",
+         lambda: models.storage.clusters((30, -5, 40, 5), 4)),
+        ("clusters zoom 8",
+         lambda: models.storage.clusters((30, -5, 40, 5), 8)),
+        ("scan radius 5 km", lambda: scan(0.0, 35.0, 5)),
+    ]
+    print("{:<20} {:>10} {:>10}".format("query", "results", "best(ms)"))
+    for name, function in named:
+        print("{:<20} {:>10} {:>10.3f}".format(name, len(function()),
+                                               timed(function)))
@@ -0,0 +1,134 @@
+#!/usr/bin/python3
+"""
+Times the hot DBStorage queries before and after the model indexes are
+created by DBStorage.migrate(), with SQLite standing in for MySQL
+usage: ./benchmarks/bench_indexes.py [number of places]
+"""
+
+from datetime import datetime
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIRECTORY = tempfile.TemporaryDirectory()
+os.environ["HBNB_TYPE_STORAGE"] = "db"
+os.environ.setdefault("HBNB_DB_URL", "sqlite:///" + os.path.join(
+    DIRECTORY.name, "hbnb.db"))
+os.environ.pop("HBNB_ENV", None)
+sys.path.insert(0, ROOT)
+import models  # noqa: E402
+from models.base_model import Base  # noqa: E402
+from models.city import City  # noqa: E402
+from models.place import Place, place_amenity  # noqa: E402
+from models.review import Review  # noqa: E402
+from sqlalchemy import create_engine, select  # noqa: E402
+
+
+def rows(cls_name, n, **columns):
+    """returns n rows for the table of cls_name, each column value being
+    computed from the row number"""
+    now = datetime.utcnow()
+    result = []
+    for i in range(n):
+        row = {"id": str(uuid.uuid4()), "created_at": now, "updated_at": now}
+        row.update({key: value(i) for key, value in columns.items()})
+        result.append(row)
+    return result
+
+
+def populate(engine, n_places):
+    """inserts about 3.5 * n_places rows, then drops the model indexes"""
+    tables = Base.metadata.tables
+    states = rows("State", 50, name=lambda i: "State {}".format(i))
+    cities = rows("City", max(n_places // 20, 1),
+                  name=lambda i: "City {}".format(i),
+                  state_id=lambda i: states[i % 50]["id"])
+    users = rows("User", max(n_places // 10, 1),
+                 email=lambda i: "u{}@hbnb.io".format(i),
+                 password=lambda i: "pwd")
+    amenities = rows("Amenity", 50, name=lambda i: "Amenity {}".format(i))
+    places = rows("Place", n_places, name=lambda i: "Place {}".format(i),
+                  city_id=lambda i: cities[i % len(cities)]["id"],
+                  user_id=lambda i: users[i % len(users)]["id"],
+                  number_rooms=lambda i: i % 6,
+                  number_bathrooms=lambda i: i % 3,
+                  max_guest=lambda i: i % 8,
+                  price_by_night=lambda i: (i * 7919) % 1000,
+                  latitude=lambda i: (i * 0.37) % 180 - 90,
+                  longitude=lambda i: (i * 0.73) % 360 - 180)
+    reviews = rows("Review", n_places, text=lambda i: "Nice",
+                   place_id=lambda i: places[i]["id"],
+                   user_id=lambda i: users[(i * 31) % len(users)]["id"])
+    links = [{"place_id": place["id"],
+              "amenity_id": amenities[(i + k) % 50]["id"]}
+             for i, place in enumerate(places) for k in range(3)]
+    with engine.begin() as conn:
+        for table, table_rows in [("states", states), ("cities", cities),
+                                  ("users", users),
+                                  ("amenities", amenities),
+                                  ("places", places), ("reviews", reviews),
+                                  ("place_amenity", links)]:
+            conn.execute(tables[table].insert(), table_rows)
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.drop(conn)
+    return states, cities, users, amenities, places
+
+
+def queries(states, cities, users, amenities, places):
+    """returns the name and function of each query to time"""
+    find = models.storage.find
+    by_amenity = select(place_amenity.c.place_id).where(
+        place_amenity.c.amenity_id == amenities[7]["id"])
+    return [
+        ("cities of a state",
+         lambda: find(City, {"state_id": states[7]["id"]})),
+        ("places of a city",
+         lambda: find(Place, {"city_id": cities[7]["id"]})),
+        ("places of a user",
+         lambda: find(Place, {"user_id": users[7]["id"]})),
+        ("reviews of a place",
+         lambda: find(Review, {"place_id": places[7]["id"]})),
+        ("10 cheapest places",
+         lambda: find(Place, order_by="price_by_night", limit=10)),
+        ("price 100..110",
+         lambda: find(Place, {"price_by_night__gte": 100,
+                              "price_by_night__lte": 110})),
+        ("guests >= 7, 10 places",
+         lambda: find(Place, {"max_guest__gte": 7}, limit=10)),
+        ("1 degree box",
+         lambda: find(Place, {"latitude__gte": 10, "latitude__lte": 11,
+                              "longitude__gte": 20,
+                              "longitude__lte": 21})),
+        ("places with an amenity",
+         lambda: find(Place, {"id__in": by_amenity}, limit=100)),
+    ]
+
+
+def timed(function, repeat=5):
+    """returns the best time of function over repeat runs, in ms"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        models.storage.close()
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+if __name__ == "__main__":
+    n_places = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    engine = create_engine(os.environ["HBNB_DB_URL"])
+    data = populate(engine, n_places)
+    named = queries(*data)
+    before = [timed(function) for _, function in named]
+    created = models.storage.migrate()
+    after = [timed(function) for _, function in named]
+    print("created: " + ", ".join(created))
+    print("{:<24} {:>12} {:>12}".format("query", "before(ms)", "after(ms)"))
+    for (name, _), old, new in zip(named, before, after):
+        print("{:<24} {:>12.2f} {:>12.2f}".format(name, old, new))
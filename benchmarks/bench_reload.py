@@ -0,0 +1,88 @@
+#!/usr/bin/python3
+"""
+Measures FileStorage startup time and resident memory, eager vs lazy
+usage: ./benchmarks/bench_reload.py [number of places]
+"""
+
+from datetime import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+time = "%Y-%m-%dT%H:%M:%S.%f"
+
+CHILD = """
+import resource
+import time
+start = time.perf_counter()
+import models
+startup = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+models.storage.all()
+touch = time.perf_counter() - start
+print(startup, rss, touch, models.storage.count())
+"""
+
+
+def record(cls_name, **kwargs):
+    """returns a stored record of class cls_name"""
+    now = datetime.utcnow().strftime(time)
+    rec = {"__class__": cls_name, "id": str(uuid.uuid4()),
+           "created_at": now, "updated_at": now}
+    rec.update(kwargs)
+    return rec
+
+
+def dataset(n_places):
+    """returns a file.json content holding about 2.5 * n_places objects"""
+    records = []
+    states = [record("State", name="State {}".format(i)) for i in range(50)]
+    cities = [record("City", name="City {}".format(i),
+                     state_id=states[i % 50]["id"])
+              for i in range(max(n_places // 20, 1))]
+    users = [record("User", email="u{}@hbnb.io".format(i), password="pwd")
+             for i in range(max(n_places // 10, 1))]
+    records.extend(states + cities + users)
+    for i in range(n_places):
+        place = record("Place", name="Place {}".format(i),
+                       city_id=cities[i % len(cities)]["id"],
+                       user_id=users[i % len(users)]["id"],
+                       price_by_night=i % 500, max_guest=i % 8,
+                       latitude=(i % 180) - 90.0,
+                       longitude=(i % 360) - 180.0)
+        records.append(place)
+        records.append(record("Review", text="Nice", place_id=place["id"],
+                              user_id=place["user_id"]))
+    return {r["__class__"] + "." + r["id"]: r for r in records}
+
+
+def run(directory, lazy):
+    """runs the child process and returns its measures"""
+    env = dict(os.environ, PYTHONPATH=ROOT,
+               HBNB_FILE_LAZY="1" if lazy else "0")
+    env.pop("HBNB_TYPE_STORAGE", None)
+    out = subprocess.check_output([sys.executable, "-c", CHILD],
+                                  cwd=directory, env=env)
+    startup, rss, touch, count = out.split()
+    return float(startup), int(rss), float(touch), int(count)
+
+
+if __name__ == "__main__":
+    n_places = int(sys.argv[1]) if len(sys.argv) > 1 else 40000
+    with tempfile.TemporaryDirectory() as empty, \
+            tempfile.TemporaryDirectory() as full:
+        with open(os.path.join(full, "file.json"), "w") as f:
+            json.dump(dataset(n_places), f)
+        base = run(empty, False)
+        print("{:>6} {:>8} {:>12} {:>12} {:>9}".format(
+            "mode", "objects", "startup(s)", "rss(MiB)", "all()(s)"))
+        for lazy in (False, True):
+            startup, rss, touch, count = run(full, lazy)
+            print("{:>6} {:>8} {:>12.3f} {:>12.1f} {:>9.3f}".format(
+                "lazy" if lazy else "eager", count, startup - base[0],
+                (rss - base[1]) / 1024, touch))
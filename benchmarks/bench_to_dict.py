@@ -0,0 +1,60 @@
+#!/usr/bin/python3
+"""
+Compares the compiled to_dict() serializers with the generic one
+usage: ./benchmarks/bench_to_dict.py [number of objects]
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+from models.base_model import time  # noqa: E402
+from models.place import Place  # noqa: E402
+from models.state import State  # noqa: E402
+from models.user import User  # noqa: E402
+
+
+def generic_to_dict(obj):
+    """the to_dict() BaseModel used to run for every class"""
+    new_dict = obj.__dict__.copy()
+    if "created_at" in new_dict:
+        new_dict["created_at"] = new_dict["created_at"].strftime(time)
+    if "updated_at" in new_dict:
+        new_dict["updated_at"] = new_dict["updated_at"].strftime(time)
+    new_dict["__class__"] = obj.__class__.__name__
+    if "_sa_instance_state" in new_dict:
+        del new_dict["_sa_instance_state"]
+    return new_dict
+
+
+def objects(n):
+    """returns n objects of a few classes"""
+    objs = []
+    for i in range(n):
+        if i % 3 == 0:
+            objs.append(State(name="State {}".format(i)))
+        elif i % 3 == 1:
+            objs.append(User(email="u{}@hbnb.io".format(i), password="pwd"))
+        else:
+            objs.append(Place(name="Place {}".format(i), city_id="c",
+                              user_id="u", price_by_night=i % 500))
+    return objs
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    objs = objects(n)
+    for obj in objs:
+        assert obj.to_dict() == generic_to_dict(obj)
+    generic = min(timeit.repeat(lambda: [generic_to_dict(o) for o in objs],
+                                number=1, repeat=5))
+    compiled = min(timeit.repeat(lambda: [o.to_dict() for o in objs],
+                                 number=1, repeat=5))
+    print("{} objects".format(n))
+    print("generic  to_dict: {:.3f} s ({:.2f} us/object)".format(
+        generic, generic / n * 1e6))
+    print("compiled to_dict: {:.3f} s ({:.2f} us/object)".format(
+        compiled, compiled / n * 1e6))
+    print("speedup: {:.2f}x".format(generic / compiled))
@@ -96,7 +96,7 @@ class HBNBCommand(cmd.Cmd):
             if len(args) > 1:
                 key = args[0] + "." + args[1]
                 if key in models.storage.all():
-                    models.storage.all().pop(key)
+                    models.storage.delete(models.storage.all()[key])
                     models.storage.save()
                 else:
                     print("** no instance found **")
@@ -160,5 +160,14 @@ class HBNBCommand(cmd.Cmd):
         else:
             print("** class doesn't exist **")
 
+    def do_migrate(self, arg):
+        """Adds the tables and indexes missing from the database and
+        computes the map tile aggregates of the places when missing"""
+        if models.storage_t != "db":
+            print("** migrate needs db storage **")
+            return False
+        for name in models.storage.migrate():
+            print(name)
+
 if __name__ == '__main__':
     HBNBCommand().cmdloop()
@@ -3,27 +3,94 @@
 Contains the class DBStorage
 """
 
+from datetime import datetime
+import heapq
+from itertools import islice
+import json
+import logging
 import models
+import operator
 from models.amenity import Amenity
-from models.base_model import BaseModel, Base
+from models.base_model import BaseModel, Base, json_cache
 from models.city import City
+from models.engine.geo import EARTH_RADIUS, MAX_ZOOM, cluster, coordinates
+from models.engine.geo import distance, longitudes, radius_box, tile
+from models.engine.geo import tile_box, tile_path, tile_ranges
+from models.engine.object_cache import ObjectCache
 from models.place import Place
 from models.review import Review
 from models.state import State
 from models.user import User
+from math import pi
 from os import getenv
+import random
 import sqlalchemy
-from sqlalchemy import create_engine
-from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy import bindparam, case, create_engine, event, func, or_
+from sqlalchemy import select
+import sys
+import threading
+import time
+from sqlalchemy.orm import joinedload, make_transient_to_detached
+from sqlalchemy.orm import scoped_session, selectinload, Session, sessionmaker
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.sql import Select
 
 classes = {"Amenity": Amenity, "City": City,
            "Place": Place, "Review": Review, "State": State, "User": User}
+slow_query_log = logging.getLogger("hbnb.slow_query")
+operators = {"": operator.eq, "in": lambda column, values: column.in_(values),
+             "gt": operator.gt, "gte": operator.ge,
+             "lt": operator.lt, "lte": operator.le}
+
+
+class RoutingSession(Session):
+    """session sending its reads to a replica until it writes, and
+    everything to the primary engine from then on"""
+
+    def __init__(self, replicas=(), **kwargs):
+        """picks the replica serving the reads of this session"""
+        super().__init__(**kwargs)
+        self.replica = random.choice(replicas) if replicas else None
+        self.written = False
+        self.primary = False
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        """returns the primary engine for writes, locking reads, every
+        statement after a write and the reads made while primary is set,
+        a replica otherwise"""
+        if self._flushing or not isinstance(clause, Select) or \
+                clause._for_update_arg is not None:
+            self.written = True
+        if self.replica is None or self.written or self.primary:
+            return super().get_bind(mapper, clause=clause, **kwargs)
+        return self.replica
 
 
 class DBStorage:
     """interaacts with the MySQL database"""
     __engine = None
     __session = None
+    # list - engines of the read replicas, empty to read from __engine
+    __replicas = None
+    # dictionary - connection pool events counted since each engine started
+    __pool_events = None
+    # ObjectCache - column values of the objects read by get() and all(),
+    # kept across sessions, or None when HBNB_DB_CACHE_BYTES is not set
+    __cache = None
+    # local - statements run by each thread since its session was closed
+    __query_stats = threading.local()
+    # float - seconds past which a statement goes to the slow query log
+    __slow_query = float(getenv('HBNB_DB_SLOW_QUERY_MS', 200)) / 1000
+    # integer - number of slowest statements kept in the query stats
+    __slowest = 3
+    # float - radius in km the nearest places are first looked for within,
+    # doubled until enough are found
+    __nearest_km = 10.0
+    # tuple - columns of a place its tile aggregates are computed from
+    __tiled_columns = ("id", "latitude", "longitude", "price_by_night")
+    # boolean - place_tiles was seen to hold the aggregates of every place
+    __tiles_ready = False
 
     def __init__(self):
         """Instantiate a DBStorage object"""
@@ -32,25 +99,323 @@ class DBStorage:
         HBNB_MYSQL_HOST = getenv('HBNB_MYSQL_HOST')
         HBNB_MYSQL_DB = getenv('HBNB_MYSQL_DB')
         HBNB_ENV = getenv('HBNB_ENV')
-        self.__engine = create_engine('mysql+mysqldb://{}:{}@{}/{}'.
-                                      format(HBNB_MYSQL_USER,
-                                             HBNB_MYSQL_PWD,
-                                             HBNB_MYSQL_HOST,
-                                             HBNB_MYSQL_DB))
+        HBNB_DB_URL = getenv('HBNB_DB_URL')
+        if HBNB_DB_URL is None:
+            HBNB_DB_URL = 'mysql+mysqldb://{}:{}@{}/{}'.format(
+                HBNB_MYSQL_USER, HBNB_MYSQL_PWD, HBNB_MYSQL_HOST,
+                HBNB_MYSQL_DB)
+        HBNB_DB_REPLICA_URLS = getenv('HBNB_DB_REPLICA_URLS', "")
+        self.__engine = create_engine(HBNB_DB_URL, **self._pool_options())
+        self.__replicas = [create_engine(url.strip(), **self._pool_options())
+                           for url in HBNB_DB_REPLICA_URLS.split(",")
+                           if url.strip()]
+        self.__pool_events = {}
+        for engine in [self.__engine] + self.__replicas:
+            self._watch_pool(engine)
+            self._watch_queries(engine)
+        HBNB_DB_SLOW_QUERY_LOG = getenv('HBNB_DB_SLOW_QUERY_LOG')
+        if HBNB_DB_SLOW_QUERY_LOG and not slow_query_log.handlers:
+            slow_query_log.addHandler(
+                logging.FileHandler(HBNB_DB_SLOW_QUERY_LOG))
+            slow_query_log.propagate = False
+        HBNB_DB_CACHE_BYTES = int(getenv('HBNB_DB_CACHE_BYTES', 0))
+        if HBNB_DB_CACHE_BYTES > 0:
+            self.__cache = ObjectCache(
+                HBNB_DB_CACHE_BYTES, float(getenv('HBNB_DB_CACHE_TTL', 300)))
         if HBNB_ENV == "test":
             Base.metadata.drop_all(self.__engine)
 
-    def all(self, cls=None):
-        """query on the current database session"""
+    @staticmethod
+    def _pool_options():
+        """returns the connection pool options set in the environment:
+        HBNB_DB_POOL_SIZE, HBNB_DB_MAX_OVERFLOW, HBNB_DB_POOL_TIMEOUT,
+        HBNB_DB_POOL_RECYCLE (3600 seconds by default) and
+        HBNB_DB_POOL_PRE_PING (1 by default, 0 to disable)"""
+        options = {"pool_recycle": int(getenv('HBNB_DB_POOL_RECYCLE', 3600)),
+                   "pool_pre_ping": getenv('HBNB_DB_POOL_PRE_PING') != "0"}
+        for option, name, kind in [("pool_size", "HBNB_DB_POOL_SIZE", int),
+                                   ("max_overflow", "HBNB_DB_MAX_OVERFLOW",
+                                    int),
+                                   ("pool_timeout", "HBNB_DB_POOL_TIMEOUT",
+                                    float)]:
+            value = getenv(name)
+            if value:
+                options[option] = kind(value)
+        return options
+
+    def _watch_pool(self, engine):
+        """counts the connections the pool of engine opens and checks out"""
+        events = {"connects": 0, "checkouts": 0, "peak_checked_out": 0}
+        self.__pool_events[engine] = events
+
+        def on_connect(dbapi_connection, connection_record):
+            """counts the connections opened by the pool"""
+            events["connects"] += 1
+
+        def on_checkout(dbapi_connection, connection_record,
+                        connection_proxy):
+            """counts the connections checked out of the pool"""
+            events["checkouts"] += 1
+            checkedout = getattr(engine.pool, "checkedout", None)
+            if checkedout is not None:
+                events["peak_checked_out"] = max(events["peak_checked_out"],
+                                                 checkedout())
+        event.listen(engine, "connect", on_connect)
+        event.listen(engine, "checkout", on_checkout)
+
+    def _watch_queries(self, engine):
+        """times the statements engine runs"""
+        def before_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+            """notes when the statement started"""
+            conn.info.setdefault("query_start", []).append(
+                time.perf_counter())
+
+        def after_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+            """records the statement and how long it took"""
+            elapsed = time.perf_counter() - conn.info["query_start"].pop()
+            self._record_query(engine, statement, elapsed, cursor.rowcount)
+        event.listen(engine, "before_cursor_execute", before_execute)
+        event.listen(engine, "after_cursor_execute", after_execute)
+
+    def _record_query(self, engine, statement, elapsed, rowcount):
+        """adds a statement to the stats of the current thread and logs it
+        if it is slow"""
+        stats = self.query_stats()
+        stats["queries"] += 1
+        stats["time_ms"] += elapsed * 1000
+        slowest = stats["slowest"]
+        if len(slowest) < self.__slowest or \
+                elapsed * 1000 > slowest[-1]["time_ms"]:
+            slowest.append({"time_ms": elapsed * 1000,
+                            "statement": " ".join(statement.split())})
+            slowest.sort(key=lambda query: -query["time_ms"])
+            del slowest[self.__slowest:]
+        if elapsed >= self.__slow_query:
+            slow_query_log.warning(json.dumps({
+                "time_ms": round(elapsed * 1000, 3),
+                "database": engine.url.render_as_string(hide_password=True),
+                "rows": rowcount,
+                "statement": " ".join(statement.split())}))
+
+    def query_stats(self):
+        """returns the number of statements the current thread ran since
+        its session was closed or reloaded, their total time and the
+        slowest ones"""
+        stats = getattr(self.__query_stats, "stats", None)
+        if stats is None:
+            stats = {"queries": 0, "time_ms": 0.0, "slowest": []}
+            self.__query_stats.stats = stats
+        return stats
+
+    def _engine_stats(self, engine):
+        """returns the state of the connection pool of engine and the
+        events counted since it started"""
+        pool = engine.pool
+        stats = {"pool": type(pool).__name__}
+        for name in ["size", "checkedin", "checkedout", "overflow",
+                     "timeout"]:
+            method = getattr(pool, name, None)
+            if method is not None:
+                stats[name] = method()
+        stats.update(self.__pool_events[engine])
+        return stats
+
+    def pool_stats(self):
+        """returns the state of the connection pool of the primary engine,
+        with the one of each replica under "replicas" if any"""
+        stats = self._engine_stats(self.__engine)
+        if self.__replicas:
+            stats["replicas"] = [self._engine_stats(engine)
+                                 for engine in self.__replicas]
+        return stats
+
+    @staticmethod
+    def _loaders(cls, load, strategy=selectinload):
+        """returns the loader options eagerly loading the relationship
+        paths in load, such as "cities" or "cities.places", from cls"""
+        options = []
+        for path in load or ():
+            option = None
+            current = cls
+            for name in path.split("."):
+                attr = getattr(current, name)
+                if option is None:
+                    option = strategy(attr)
+                else:
+                    option = getattr(option, strategy.__name__)(attr)
+                current = attr.property.mapper.class_
+            options.append(option)
+        return options
+
+    def all(self, cls=None, load=None):
+        """query on the current database session. load lists the
+        relationships of cls to load eagerly, such as ["cities"]"""
         new_dict = {}
+        session = self.__session()
+        cache = None if load else self._cache_for(session)
         for clss in classes:
-            if cls is None or cls is classes[clss] or cls is clss:
-                objs = self.__session.query(classes[clss]).all()
+            if cls is None or cls is classes[clss] or cls == clss:
+                records = None if cache is None else cache.get((clss, None))
+                if records is not None:
+                    objs = [self._attach(session, classes[clss], record)
+                            for record in records]
+                elif cache is not None:
+                    generation = cache.generation()
+                    objs = self._fill(session, lambda: session.query(
+                        classes[clss]).populate_existing().all())
+                    self._remember(cache, (clss, None), objs, generation)
+                else:
+                    query = self.__session.query(classes[clss])
+                    if load and cls is not None:
+                        query = query.options(
+                            *self._loaders(classes[clss], load))
+                    objs = query.all()
                 for obj in objs:
                     key = obj.__class__.__name__ + '.' + obj.id
                     new_dict[key] = obj
         return (new_dict)
 
+    def iter(self, cls=None, batch_size=1000, load=None):
+        """yields the objects of cls, or of every class, streaming the
+        rows from a server-side cursor batch_size at a time"""
+        for clss in classes:
+            if cls is None or cls is classes[clss] or cls == clss:
+                stmt = select(classes[clss])
+                if load and cls is not None:
+                    stmt = stmt.options(*self._loaders(classes[clss], load))
+                stmt = stmt.execution_options(yield_per=batch_size)
+                for obj in self.__session.execute(stmt).scalars():
+                    yield obj
+
+    def find(self, cls, where=None, order_by=None, limit=None, offset=0,
+             load=None):
+        """returns the objects of cls matching where, sorted by order_by,
+        then sliced by offset and limit, in a single query. where maps
+        attributes, optionally suffixed by __in, __gt, __gte, __lt or
+        __lte, to the value they are compared to. order_by is an attribute
+        or a list of them, prefixed by "-" to sort from the largest."""
+        cls = self._mapped(cls)
+        if cls is None:
+            return []
+        stmt = select(cls)
+        for name, value in (where or {}).items():
+            attr, _, op = name.partition("__")
+            stmt = stmt.where(operators[op](getattr(cls, attr), value))
+        if isinstance(order_by, str):
+            order_by = [order_by]
+        for field in order_by or ():
+            column = getattr(cls, field.lstrip("-"))
+            stmt = stmt.order_by(column.desc() if field.startswith("-")
+                                 else column)
+        if offset:
+            stmt = stmt.offset(offset)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        stmt = stmt.options(*self._loaders(cls, load))
+        return list(self.__session.execute(stmt).scalars())
+
+    def search_places(self, states=None, cities=None, amenities=None,
+                      limit=None, offset=0, ranges=None, order_by=None,
+                      bbox=None, radius=None, nearest=None):
+        """returns the places located in one of the states or cities, or
+        anywhere when neither is given, having every amenity in amenities
+        and, for each attr: (low, high) of ranges, attr between low and
+        high included (None for no bound), inside bbox, (west, south, east,
+        north), and within radius, (latitude, longitude, km), sorted by
+        order_by ("-" prefixed for descending order) then by id, sliced by
+        offset and limit, in a single query. Circles are looked up as the
+        box around them, on the latitude and longitude index, and the
+        places of the corners dropped as rows are read. nearest, (place
+        id, k), instead keeps the k places closest to the place, sorted by
+        distance."""
+        stmt = select(Place)
+        if states or cities:
+            located = []
+            if cities:
+                located.append(Place.city_id.in_(set(cities)))
+            if states:
+                stmt = stmt.join(City, Place.city_id == City.id)
+                located.append(City.state_id.in_(set(states)))
+            stmt = stmt.where(or_(*located))
+        if amenities:
+            wanted = set(amenities)
+            place_amenity = Base.metadata.tables["place_amenity"]
+            stmt = stmt.join(place_amenity,
+                             place_amenity.c.place_id == Place.id).where(
+                place_amenity.c.amenity_id.in_(wanted)).group_by(
+                Place.id).having(
+                func.count(place_amenity.c.amenity_id) == len(wanted))
+        for attr, (low, high) in (ranges or {}).items():
+            column = getattr(Place, attr)
+            if low is not None:
+                stmt = stmt.where(column >= low)
+            if high is not None:
+                stmt = stmt.where(column <= high)
+        if bbox is not None:
+            west, south, east, north = bbox
+            stmt = self._within(stmt, south, north, longitudes(west, east))
+        if radius is not None:
+            stmt = self._within(stmt, *radius_box(*radius))
+        stop = None if limit is None else offset + limit
+        if nearest is not None:
+            return self._nearest(stmt, *nearest)[offset:stop]
+        if order_by is None:
+            stmt = stmt.order_by(Place.id)
+        elif order_by.startswith("-"):
+            stmt = stmt.order_by(getattr(Place, order_by[1:]).desc(),
+                                 Place.id.desc())
+        else:
+            stmt = stmt.order_by(getattr(Place, order_by), Place.id)
+        if radius is not None:
+            rows = self.__session.execute(
+                stmt.execution_options(yield_per=1000)).scalars()
+            inside = (place for place in rows if distance(
+                place.latitude, place.longitude, *radius[:2]) <= radius[2])
+            return list(islice(inside, offset, stop))
+        if offset:
+            stmt = stmt.offset(offset)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        return list(self.__session.execute(stmt).scalars())
+
+    @staticmethod
+    def _within(stmt, south, north, spans):
+        """restricts stmt to the places between the south and north
+        latitudes and in one of the (west, east) longitude spans"""
+        return stmt.where(Place.latitude.between(south, north), or_(
+            *[Place.longitude.between(west, east) for west, east in spans]))
+
+    def _nearest(self, stmt, place_id, k):
+        """returns the k places selected by stmt closest to the place of
+        place_id, sorted by distance then id. Only the ids and coordinates
+        of the places in the box around a circle are read, the radius of
+        the circle doubling until k places are found within it."""
+        place = self.__session.get(Place, place_id)
+        origin = None if place is None else \
+            coordinates(place.latitude, place.longitude)
+        if origin is None or k <= 0:
+            return []
+        points = stmt.with_only_columns(
+            Place.id, Place.latitude, Place.longitude).where(
+            Place.id != place_id)
+        km = self.__nearest_km
+        while True:
+            rows = self.__session.execute(
+                self._within(points, *radius_box(*origin, km)))
+            found = [(distance(*origin, latitude, longitude), id)
+                     for id, latitude, longitude in rows]
+            found = [row for row in found if row[0] <= km]
+            if len(found) >= k or km >= pi * EARTH_RADIUS:
+                break
+            km *= 2
+        ids = [id for _, id in heapq.nsmallest(k, found)]
+        places = self.__session.execute(
+            select(Place).where(Place.id.in_(ids))).scalars()
+        places = {place.id: place for place in places}
+        return [places[id] for id in ids if id in places]
+
     def new(self, obj):
         """add the object to the current database session"""
         self.__session.add(obj)
@@ -64,31 +429,484 @@ class DBStorage:
         if obj is not None:
             self.__session.delete(obj)
 
+    @staticmethod
+    def _batches(rows):
+        """groups rows by their set of keys, as executemany() needs"""
+        batches = {}
+        for row in rows:
+            batches.setdefault(tuple(sorted(row)), []).append(row)
+        return batches.values()
+
+    def bulk_new(self, objs):
+        """inserts many objects with one executemany() per class and set
+        of attributes, then commits. The objects are not attached to the
+        session."""
+        rows = {}
+        names = set()
+        for obj in objs:
+            names.add(obj.__class__.__name__)
+            table = obj.__table__
+            row = {column.key: obj.__dict__[column.key]
+                   for column in table.columns if column.key in obj.__dict__}
+            rows.setdefault(table, []).append(row)
+        for table, table_rows in rows.items():
+            for batch in self._batches(table_rows):
+                self.__session.execute(table.insert(), batch)
+        self._retile(self.__session, [], [
+            self._tiled(row) for row in rows.get(Place.__table__, ())])
+        self.save()
+        for cls_name in names:
+            self._invalidate(cls_name)
+
+    def bulk_update(self, cls, changes):
+        """applies changes, a dictionary of id -> {attribute: value}, to
+        the objects of cls with one executemany() per set of attributes,
+        then commits. Returns the number of objects updated."""
+        cls = self._mapped(cls)
+        if cls is None:
+            return 0
+        table = cls.__table__
+        now = datetime.utcnow()
+        rows = []
+        for id, attrs in changes.items():
+            row = {"v_" + key: value for key, value in attrs.items()
+                   if key in table.columns and
+                   key not in ("id", "created_at", "updated_at")}
+            row["v_updated_at"] = now
+            row["b_id"] = id
+            rows.append(row)
+        moved = cls is Place and any(
+            key in self.__tiled_columns
+            for attrs in changes.values() for key in attrs)
+        if moved:
+            removed = self._tile_rows(self.__session, changes)
+        count = 0
+        for batch in self._batches(rows):
+            values = {key[2:]: bindparam(key) for key in batch[0]
+                      if key != "b_id"}
+            stmt = table.update().where(table.c.id == bindparam("b_id"))
+            result = self.__session.execute(stmt.values(values), batch)
+            count += result.rowcount
+        if moved:
+            self._retile(self.__session, removed,
+                         self._tile_rows(self.__session, changes))
+        self._forget(cls, changes, self.__session.expire)
+        self.save()
+        self._invalidate(cls.__name__, changes)
+        return count
+
+    def bulk_delete(self, cls, ids):
+        """deletes the objects of cls with the given ids, and their rows in
+        association tables, with one query each, then commits. Returns the
+        number of objects deleted."""
+        cls = self._mapped(cls)
+        ids = list(set(ids))
+        if cls is None or not ids:
+            return 0
+        if cls is Place:
+            self._retile(self.__session,
+                         self._tile_rows(self.__session, ids), [])
+        for rel in sqlalchemy.inspect(cls).relationships:
+            if rel.secondary is not None:
+                for column in rel.secondary.columns:
+                    if column.references(cls.__table__.c.id):
+                        self.__session.execute(rel.secondary.delete().where(
+                            column.in_(ids)))
+        count = self.__session.query(cls).filter(cls.id.in_(ids)).delete(
+            synchronize_session=False)
+        self._forget(cls, ids, self.__session.expunge)
+        self.save()
+        self._invalidate(cls.__name__, ids)
+        return count
+
+    def _forget(self, cls, ids, action):
+        """applies action to the objects of cls with the given ids held by
+        the session and drops their cached JSON"""
+        for obj in list(self.__session.identity_map.values()):
+            if isinstance(obj, cls) and obj.id in ids:
+                json_cache.pop(obj, None)
+                action(obj)
+
+    def migrate(self):
+        """creates the tables and indexes missing from the database,
+        leaving the existing ones untouched. Returns the names of the
+        indexes created. The tile aggregates of the places are computed,
+        in one transaction, unless storage_markers records they were."""
+        Base.metadata.create_all(self.__engine)
+        if not self._tiles_ready(self.__session):
+            markers = Base.metadata.tables["storage_markers"]
+            self.__session.execute(markers.insert().values(name="place_tiles"))
+            self.__tiles_ready = True
+            tiles = Base.metadata.tables["place_tiles"]
+            self.__session.execute(tiles.delete())
+            self._retile(self.__session, [], self.__session.execute(select(
+                Place.id, Place.latitude, Place.longitude,
+                Place.price_by_night)).all())
+            self.save()
+        inspector = sqlalchemy.inspect(self.__engine)
+        created = []
+        for table in Base.metadata.sorted_tables:
+            existing = {index["name"]
+                        for index in inspector.get_indexes(table.name)}
+            for index in sorted(table.indexes, key=lambda i: i.name):
+                if index.name not in existing:
+                    index.create(self.__engine)
+                    created.append(index.name)
+        return created
+
     def reload(self):
-        """reloads data from the database"""
+        """reloads data from the database. A new database has its empty
+        tile aggregates marked as complete, while those of a database with
+        places are left to migrate()."""
+        new = not sqlalchemy.inspect(self.__engine).has_table(
+            Place.__tablename__)
         Base.metadata.create_all(self.__engine)
-        sess_factory = sessionmaker(bind=self.__engine, expire_on_commit=False)
+        if new:
+            markers = Base.metadata.tables["storage_markers"]
+            try:
+                with self.__engine.begin() as connection:
+                    connection.execute(markers.insert().values(
+                        name="place_tiles"))
+            except sqlalchemy.exc.IntegrityError:
+                pass
+        self.__tiles_ready = False
+        sess_factory = sessionmaker(bind=self.__engine, expire_on_commit=False,
+                                    class_=RoutingSession,
+                                    replicas=self.__replicas)
+        if self.__cache is not None:
+            event.listen(sess_factory, "after_flush", self._flushed)
+            event.listen(sess_factory, "after_commit", self._committed)
+        event.listen(sess_factory, "before_flush", self._moving)
+        event.listen(sess_factory, "after_flush", self._moved)
         Session = scoped_session(sess_factory)
         self.__session = Session
+        self.__query_stats.stats = None
+
+    @staticmethod
+    def _class_name(cls):
+        """returns the class name for a class or a class name string"""
+        if isinstance(cls, str):
+            return cls
+        return cls.__name__
+
+    @staticmethod
+    def _mapped(cls):
+        """returns the mapped class for a class or a class name string"""
+        if isinstance(cls, str):
+            return classes.get(cls)
+        if cls in classes.values():
+            return cls
+        return None
+
+    def _cache_for(self, session):
+        """returns the cache when session can read from it, None when the
+        cache is disabled or session holds or has written changes"""
+        if self.__cache is None or session.written or session.new or \
+                session.dirty or session.deleted:
+            return None
+        return self.__cache
+
+    @staticmethod
+    def _fill(session, read):
+        """returns read(), run against the primary engine and refreshing
+        the objects session holds, so that the cache is never filled with
+        rows a replica or session has not caught up with yet"""
+        session.primary = True
+        try:
+            return read()
+        finally:
+            session.primary = False
+
+    @staticmethod
+    def _remember(cache, key, objs, generation):
+        """caches the column values of objs, an object or a list of them,
+        under key, unless the cache was invalidated since generation"""
+        many = isinstance(objs, list)
+        records = []
+        size = sys.getsizeof(records)
+        for obj in objs if many else [objs]:
+            record = {column.key: obj.__dict__[column.key]
+                      for column in obj.__table__.columns
+                      if column.key in obj.__dict__}
+            size += sys.getsizeof(record) + \
+                sum(sys.getsizeof(value) for value in record.values())
+            records.append(record)
+        cache.set(key, records if many else records[0], size, generation)
+
+    @staticmethod
+    def _attach(session, cls, record):
+        """returns the object of cls held by session with the id of record,
+        or a new one built from record and attached to session without a
+        query"""
+        obj = session.identity_map.get(identity_key(cls, record["id"]))
+        if obj is None:
+            obj = sqlalchemy.inspect(cls).class_manager.new_instance()
+            for name, value in record.items():
+                set_committed_value(obj, name, value)
+            make_transient_to_detached(obj)
+            session.add(obj)
+        return obj
+
+    def _invalidate(self, cls_name, ids=()):
+        """drops the cached objects of cls_name with the given ids and the
+        cached list of all of them"""
+        if self.__cache is not None:
+            self.__cache.invalidate((cls_name, None))
+            for id in ids:
+                self.__cache.invalidate((cls_name, id))
+
+    def _flushed(self, session, flush_context):
+        """invalidates the objects session flushed, and keeps them to
+        invalidate them again once committed"""
+        flushed = session.info.setdefault("flushed", set())
+        for obj in session.new | session.dirty | session.deleted:
+            if obj.__class__.__name__ in classes:
+                flushed.add((obj.__class__.__name__, obj.id))
+        for cls_name, id in flushed:
+            self._invalidate(cls_name, [id])
+
+    def _committed(self, session):
+        """invalidates the objects flushed by the committed transaction"""
+        for cls_name, id in session.info.pop("flushed", ()):
+            self._invalidate(cls_name, [id])
+
+    @classmethod
+    def _tiled(cls, values):
+        """returns the id, latitude, longitude and price of the place of
+        values, a dictionary of column values, the missing ones taking
+        their column default"""
+        row = []
+        for name in cls.__tiled_columns:
+            default = Place.__table__.c[name].default
+            if default is None or not default.is_scalar:
+                row.append(values.get(name))
+            else:
+                row.append(values.get(name, default.arg))
+        return tuple(row)
 
-    def get(self, cls, id):
-        """Retrieves an object based on its class and id."""
+    def _tile_rows(self, session, ids):
+        """returns the id, latitude, longitude and price of the places of
+        ids, as stored by the primary engine"""
+        columns = [getattr(Place, name) for name in self.__tiled_columns]
+        return session.execute(select(*columns).where(
+            Place.id.in_(list(ids))).with_for_update()).all()
+
+    def _moving(self, session, flush_context, instances):
+        """keeps, before a flush, the stored columns of the places about
+        to be deleted or updated on the columns they are aggregated by"""
+        changed = [obj for obj in session.dirty if isinstance(obj, Place) and
+                   any(sqlalchemy.inspect(obj).attrs[name].history.
+                       has_changes() for name in self.__tiled_columns)]
+        deleted = [obj for obj in session.deleted if isinstance(obj, Place)]
+        ids = [obj.id for obj in changed + deleted]
+        removed = self._tile_rows(session, ids) if ids else []
+        session.info["moving"] = (removed, changed)
+
+    def _moved(self, session, flush_context):
+        """moves in the tile aggregates the places flushed from the
+        columns kept by _moving to their new ones"""
+        removed, changed = session.info.pop("moving", ([], []))
+        added = [obj for obj in session.new if isinstance(obj, Place)]
+        added = [tuple(getattr(obj, name) for name in self.__tiled_columns)
+                 for obj in changed + added]
+        if removed or added:
+            self._retile(session, removed, added)
+
+    def _tiles_ready(self, session):
+        """tells if place_tiles holds the aggregates of every place, as
+        recorded in storage_markers. The marker is read for update, so that
+        a migrate() computing them waits for the transaction of session."""
+        if not self.__tiles_ready:
+            markers = Base.metadata.tables["storage_markers"]
+            self.__tiles_ready = session.execute(select(markers.c.name).where(
+                markers.c.name == "place_tiles").with_for_update()).first() \
+                is not None
+        return self.__tiles_ready
+
+    def _retile(self, session, removed, added):
+        """updates the tile aggregates at every zoom level for the removal
+        of the places of removed and the addition of those of added, each
+        an (id, latitude, longitude, price) row, with one statement per
+        tile changed. Tiles losing their first place get it looked up
+        again when read. Nothing is done until the aggregates of the
+        places stored before place_tiles existed are computed."""
+        if not self._tiles_ready(session):
+            return
+        deltas = {}
+        for sign, rows in ((-1, removed), (1, added)):
+            for id, latitude, longitude, price in rows:
+                point = coordinates(latitude, longitude)
+                if point is None:
+                    continue
+                priced = type(price) in (int, float)
+                for position in tile_path(*point):
+                    delta = deltas.setdefault(position,
+                                              [0, 0, 0, set(), set()])
+                    delta[0] += sign
+                    if priced:
+                        delta[1] += sign * price
+                        delta[2] += sign
+                    delta[3 if sign > 0 else 4].add(id)
+        tiles = Base.metadata.tables["place_tiles"]
+        for (zoom, row, column), delta in deltas.items():
+            count, total, priced, new, gone = delta
+            new, gone = new - gone, gone - new
+            if not (count or total or priced or new or gone):
+                continue
+            where = (tiles.c.zoom == zoom, tiles.c.tile_row == row,
+                     tiles.c.tile_column == column)
+            values = {"place_count": tiles.c.place_count + count,
+                      "price_total": tiles.c.price_total + total,
+                      "priced": tiles.c.priced + priced}
+            whens = []
+            if gone:
+                whens.append((tiles.c.place_id.in_(gone), None))
+            if new:
+                whens.append((tiles.c.place_id > min(new), min(new)))
+            if whens:
+                values["place_id"] = case(*whens, else_=tiles.c.place_id)
+            result = session.execute(tiles.update().where(*where).values(
+                values))
+            if result.rowcount == 0 and count > 0:
+                session.execute(tiles.insert().values(
+                    zoom=zoom, tile_row=row, tile_column=column,
+                    place_count=count, price_total=total, priced=priced,
+                    place_id=min(new)))
+            elif count < 0:
+                session.execute(tiles.delete().where(
+                    *where, tiles.c.place_count <= 0))
+
+    def clusters(self, bbox, zoom):
+        """returns the aggregates of the places of the tiles of zoom, at
+        most MAX_ZOOM, overlapping bbox, (west, south, east, north): the box
+        of the tile, its number of places, their average price and the id
+        of its first place, read from place_tiles by primary key"""
+        zoom = min(max(zoom, 0), MAX_ZOOM)
+        west, south, east, north = bbox
+        rows, columns = tile_ranges(zoom, south, north,
+                                    longitudes(west, east))
+        tiles = Base.metadata.tables["place_tiles"]
+        stmt = select(tiles).where(
+            tiles.c.zoom == zoom,
+            tiles.c.tile_row.between(rows[0], rows[-1]),
+            or_(*[tiles.c.tile_column.between(c[0], c[-1])
+                  for c in columns])).order_by(tiles.c.tile_row,
+                                               tiles.c.tile_column)
+        result = []
+        looked_up = False
+        for row in self.__session.execute(stmt).all():
+            place_id = row.place_id
+            if place_id is None:
+                place_id = self._first(zoom, row.tile_row, row.tile_column)
+                looked_up = True
+            result.append(cluster(zoom, row.tile_row, row.tile_column,
+                                  row.place_count, row.price_total,
+                                  row.priced, place_id))
+        if looked_up:
+            self.save()
+        return result
+
+    def _first(self, zoom, row, column):
+        """returns and stores the smallest place id of a tile whose first
+        place was removed, looked up in the tiles it is made of, or in the
+        places of the tile at MAX_ZOOM"""
+        tiles = Base.metadata.tables["place_tiles"]
+        if zoom == MAX_ZOOM:
+            west, south, east, north = tile_box(zoom, row, column)
+            margin = 1e-9
+            places = self.__session.execute(select(
+                Place.id, Place.latitude, Place.longitude).where(
+                Place.latitude.between(south - margin, north + margin),
+                Place.longitude.between(west - margin, east + margin))).all()
+            first = min(id for id, latitude, longitude in places
+                        if tile(zoom, latitude, longitude) == (row, column))
+        else:
+            children = self.__session.execute(select(
+                tiles.c.tile_row, tiles.c.tile_column,
+                tiles.c.place_id).where(
+                tiles.c.zoom == zoom + 1,
+                tiles.c.tile_row.in_((2 * row, 2 * row + 1)),
+                tiles.c.tile_column.in_((2 * column, 2 * column + 1)))).all()
+            first = min(place_id if place_id is not None else
+                        self._first(zoom + 1, child_row, child_column)
+                        for child_row, child_column, place_id in children)
+        self.__session.execute(tiles.update().where(
+            tiles.c.zoom == zoom, tiles.c.tile_row == row,
+            tiles.c.tile_column == column).values(place_id=first))
+        return first
+
+    def cache_stats(self):
+        """returns the hit, miss, eviction and expiration counters of the
+        object cache with its size, or {"enabled": False} without it"""
+        if self.__cache is None:
+            return {"enabled": False}
+        stats = self.__cache.stats()
+        stats["enabled"] = True
+        return stats
+
+    def get(self, cls, id, load=None):
+        """Retrieves an object based on its class and id, joining the
+        relationships listed in load"""
+        cls = self._mapped(cls)
         if cls and id:
-            key = "{}.{}".format(cls.__name__, id)
-            dct = self.all(cls)
-            if key in dct:
-                return dct[key]
+            session = self.__session()
+            cache = None if load else self._cache_for(session)
+            key = (cls.__name__, id)
+            record = None if cache is None else cache.get(key)
+            if record is not None:
+                return self._attach(session, cls, record)
+            if cache is None:
+                return session.get(
+                    cls, id, options=self._loaders(cls, load, joinedload))
+            generation = cache.generation()
+            obj = self._fill(session, lambda: session.get(
+                cls, id, populate_existing=True))
+            if obj is not None:
+                self._remember(cache, key, obj, generation)
+            return obj
         return None
 
+    def get_many(self, cls, ids, load=None):
+        """Retrieves the objects of a class with the given ids in a single
+        query, keyed like all(), loading the relationships listed in load"""
+        new_dict = {}
+        cls = self._mapped(cls)
+        ids = list(set(ids))
+        if cls and ids:
+            query = self.__session.query(cls).filter(cls.id.in_(ids))
+            objs = query.options(*self._loaders(cls, load)).all()
+            for obj in objs:
+                new_dict[obj.__class__.__name__ + '.' + obj.id] = obj
+        return new_dict
+
     def count(self, cls=None):
         """Counts the number of class objects in storage."""
         if cls is None:
-            dct = self.all()
-        else:
-            dct = self.all(cls)
-        num_objs = len(dct)
-        return num_objs
+            return sum(self.counts().values())
+        cls = self._mapped(cls)
+        if cls is None:
+            return 0
+        return self.__session.query(func.count(cls.id)).scalar()
+
+    def counts(self, clss=None):
+        """Counts the objects of several classes, all of them by default,
+        in a single query. Returns a dictionary keyed by class name."""
+        if clss is None:
+            clss = list(classes)
+        names = [self._class_name(cls) for cls in clss]
+        columns = []
+        for name in names:
+            cls = classes.get(name)
+            if cls is None:
+                columns.append(sqlalchemy.literal(0).label(name))
+            else:
+                columns.append(self.__session.query(func.count(cls.id)).
+                               scalar_subquery().label(name))
+        if not columns:
+            return {}
+        return dict(zip(names, self.__session.query(*columns).one()))
 
     def close(self):
         """call remove() method on the private session attribute"""
         self.__session.remove()
+        self.__query_stats.stats = None
@@ -3,8 +3,21 @@
 Contains the FileStorage class
 """
 
+import atexit
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+import heapq
+from itertools import chain, islice
+from math import floor, pi, radians
 import json
+import operator
+import os
+from os import getenv
+import threading
 from models.amenity import Amenity
+from models.engine.geo import EARTH_RADIUS, MAX_ZOOM, cluster, coordinates
+from models.engine.geo import distance, longitudes, radius_box, tile
+from models.engine.geo import tile_box, tile_path, tile_ranges
 from models.base_model import BaseModel
 from models.city import City
 from models.place import Place
@@ -14,6 +27,86 @@ from models.user import User
 
 classes = {"Amenity": Amenity, "BaseModel": BaseModel, "City": City,
            "Place": Place, "Review": Review, "State": State, "User": User}
+operators = {"": operator.eq, "in": lambda value, values: value in values,
+             "gt": operator.gt, "gte": operator.ge,
+             "lt": operator.lt, "lte": operator.le}
+
+
+class _Descending:
+    """wraps a sort key to order it from the largest"""
+
+    def __init__(self, value):
+        """keeps the wrapped sort key"""
+        self.value = value
+
+    def __eq__(self, other):
+        """compares the wrapped sort keys"""
+        return self.value == other.value
+
+    def __lt__(self, other):
+        """orders the wrapped sort keys the other way around"""
+        return other.value < self.value
+
+
+class _SortedIndex:
+    """keys sorted by a numeric value, then by key, with the keys whose
+    value is missing kept apart"""
+
+    def __init__(self):
+        """creates an empty index"""
+        self.values = []
+        self.keys = []
+        self.missing = {}
+
+    def _position(self, value, key):
+        """returns where key is or would be among the keys of value"""
+        start = bisect_left(self.values, value)
+        stop = bisect_right(self.values, value, start)
+        return bisect_left(self.keys, key, start, stop)
+
+    def add(self, value, key):
+        """adds key under value, None if missing"""
+        if value is None:
+            self.missing[key] = None
+            return
+        i = self._position(value, key)
+        self.values.insert(i, value)
+        self.keys.insert(i, key)
+
+    def add_many(self, pairs):
+        """adds the keys of many (value, key) pairs, sorting them in with
+        the keys already indexed at once rather than one at a time"""
+        present = []
+        for value, key in pairs:
+            if value is None:
+                self.missing[key] = None
+            else:
+                present.append((value, key))
+        if len(present) * 256 < len(self.values):
+            for value, key in present:
+                self.add(value, key)
+            return
+        merged = sorted(chain(zip(self.values, self.keys), present))
+        self.values = [value for value, key in merged]
+        self.keys = [key for value, key in merged]
+
+    def remove(self, value, key):
+        """removes key from under value"""
+        if value is None:
+            self.missing.pop(key, None)
+            return
+        i = self._position(value, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            del self.values[i]
+            del self.keys[i]
+
+    def span(self, low=None, high=None):
+        """returns the start and stop positions of the values between low
+        and high included, either being None for no bound"""
+        start = 0 if low is None else bisect_left(self.values, low)
+        stop = len(self.values) if high is None else \
+            bisect_right(self.values, high)
+        return start, max(start, stop)
 
 
 class FileStorage:
@@ -23,66 +116,887 @@ class FileStorage:
     __file_path = "file.json"
     # dictionary - empty but will store all objects by <class name>.id
     __objects = {}
+    # dictionary - the same objects partitioned by <class name>
+    __partitions = {}
+    # dictionary - foreign key attributes to index for each class
+    __relations = {"City": ("state_id",),
+                   "Place": ("city_id", "user_id", "amenity_ids"),
+                   "Review": ("place_id", "user_id")}
+    # tuple - attributes of __relations holding a list of ids, indexed
+    # under each of them
+    __many = ("amenity_ids",)
+    # dictionary - numeric attributes to keep sorted indexes of per class
+    __ranks = {"Place": ("number_rooms", "number_bathrooms", "max_guest",
+                         "price_by_night")}
+    # dictionary - sorted indexes: (<class name>, attr) -> _SortedIndex
+    __ordered = {}
+    # dictionary - numeric values each key is currently ranked under
+    __ranked = {}
+    # dictionary - latitude and longitude attributes of each located class
+    __spatial = {"Place": ("latitude", "longitude")}
+    # float - side of the cells of __grid in degrees
+    __cell_size = 0.1
+    # dictionary - spatial grid: (row, column) -> keys located in the cell
+    __grid = {}
+    # dictionary - latitude and longitude each key is currently located at
+    __located = {}
+    # dictionary - numeric attribute averaged over the places of a tile
+    __averaged = {"Place": "price_by_night"}
+    # dictionary - aggregates of the located objects of each tile: zoom ->
+    # (row, column) -> [count, total, number of numbers totaled, smallest
+    # key or None until looked up again]
+    __tiles = {}
+    # dictionary - latitude, longitude and value each key is aggregated with
+    __tiled = {}
+    # dictionary - reverse indexes: (<class name>, attr) -> value -> keys
+    __indexes = {}
+    # dictionary - foreign key values each key is currently indexed under
+    __indexed = {}
+    # boolean - append changes to a journal instead of rewriting the file
+    __journal = getenv("HBNB_FILE_JOURNAL") == "1"
+    # string - path to the journal of changes made since the last snapshot
+    __journal_path = __file_path + ".journal"
+    # integer - journal size in bytes past which it is compacted
+    __journal_limit = int(getenv("HBNB_FILE_JOURNAL_LIMIT", 1048576))
+    # dictionary - objects changed since the last save, None once deleted
+    __changes = {}
+    # string - empty to write on every save, "request" to group the saves
+    # until close(), or a number of seconds to group the saves within
+    __group_commit = getenv("HBNB_FILE_GROUP_COMMIT", "")
+    # boolean - a save was requested but has not been written yet
+    __pending = False
+    # Timer - the scheduled group commit, if any
+    __timer = None
+    # RLock - serializes the writes to the JSON file and the journal
+    __lock = threading.RLock()
+    # tuple - inode, size and mtime of the JSON file when last loaded
+    __snapshot = None
+    # tuple - inode of the journal and the offset it was loaded up to
+    __journal_pos = (None, 0)
+    # dictionary - updated_at of each object as last written or loaded
+    __versions = {}
+    # boolean - keep the loaded records and build objects on first access
+    __lazy = getenv("HBNB_FILE_LAZY") == "1"
+    # dictionary - records not built yet: <class name> -> key -> record
+    __raw = {}
+
+    @staticmethod
+    def _class_name(cls):
+        """returns the class name for a class or a class name string"""
+        if isinstance(cls, str):
+            return cls
+        return cls.__name__
+
+    def _partition(self, cls):
+        """returns the partition holding the objects of cls"""
+        return self.__partitions.get(self._class_name(cls), {})
+
+    def _index(self, key, obj):
+        """indexes obj, an object or a record, under the current values
+        of its foreign keys"""
+        cls_name = key.split(".", 1)[0]
+        attrs = self.__relations.get(cls_name)
+        if attrs is None:
+            return
+        if type(obj) is dict:
+            values = [obj.get(attr, "") for attr in attrs]
+        else:
+            values = [getattr(obj, attr, None) for attr in attrs]
+        for i, attr in enumerate(attrs):
+            if attr in self.__many:
+                values[i] = tuple(values[i] or ())
+        values = tuple(values)
+        if self.__indexed.get(key) == values:
+            return
+        self._unindex(key)
+        for attr, value in zip(attrs, values):
+            index = self.__indexes.setdefault((cls_name, attr), {})
+            for value in value if attr in self.__many else (value,):
+                index.setdefault(value, {})[key] = None
+        self.__indexed[key] = values
 
-    def all(self, cls=None):
-        """returns the dictionary __objects"""
+    def _unindex(self, key):
+        """removes key from the reverse indexes it was added to"""
+        values = self.__indexed.pop(key, None)
+        if values is None:
+            return
+        cls_name = key.split(".", 1)[0]
+        for attr, value in zip(self.__relations[cls_name], values):
+            index = self.__indexes[(cls_name, attr)]
+            for value in value if attr in self.__many else (value,):
+                bucket = index.get(value)
+                if bucket is not None:
+                    bucket.pop(key, None)
+                    if not bucket:
+                        del index[value]
+
+    def _rank(self, key, obj, pending=None):
+        """adds obj, an object or a record, to the sorted indexes of its
+        numeric attributes. Values that are not numbers count as missing.
+        With pending, the (value, key) pairs are appended to it by index
+        instead, for _merge to add them all at once."""
+        cls_name = key.split(".", 1)[0]
+        attrs = self.__ranks.get(cls_name)
+        if attrs is None:
+            return
+        values = []
+        for attr in attrs:
+            if type(obj) is dict:
+                value = obj.get(attr, getattr(classes[cls_name], attr, None))
+            else:
+                value = getattr(obj, attr, None)
+            if type(value) not in (int, float) or value != value:
+                value = None
+            values.append(value)
+        values = tuple(values)
+        if self.__ranked.get(key) == values:
+            return
+        self._unrank(key)
+        for attr, value in zip(attrs, values):
+            if pending is None:
+                self.__ordered.setdefault((cls_name, attr),
+                                          _SortedIndex()).add(value, key)
+            else:
+                pending.setdefault((cls_name, attr), []).append((value, key))
+        self.__ranked[key] = values
+
+    def _unrank(self, key):
+        """removes key from the sorted indexes it was added to"""
+        values = self.__ranked.pop(key, None)
+        if values is None:
+            return
+        cls_name = key.split(".", 1)[0]
+        for attr, value in zip(self.__ranks[cls_name], values):
+            self.__ordered[(cls_name, attr)].remove(value, key)
+
+    def _cell(self, latitude, longitude):
+        """returns the cell of __grid holding the given point"""
+        return (floor(latitude / self.__cell_size),
+                floor(longitude / self.__cell_size))
+
+    def _locate(self, key, obj):
+        """adds obj, an object or a record, to the spatial grid when it
+        has a valid latitude and longitude of its own. The class defaults
+        do not count, like the NULL columns of DBStorage."""
+        cls_name = key.split(".", 1)[0]
+        attrs = self.__spatial.get(cls_name)
+        if attrs is None:
+            return
+        own = obj if type(obj) is dict else obj.__dict__
+        point = coordinates(*[own.get(attr) for attr in attrs])
+        attr = self.__averaged.get(cls_name)
+        if type(obj) is dict:
+            value = obj.get(attr, getattr(classes[cls_name], attr, None))
+        else:
+            value = getattr(obj, attr, None)
+        if type(value) not in (int, float) or value != value:
+            value = None
+        if point is None:
+            self._unlocate(key)
+            return
+        if self.__tiled.get(key) == point + (value,):
+            return
+        self._unlocate(key)
+        self.__grid.setdefault(self._cell(*point), {})[key] = None
+        self.__located[key] = point
+        self._tile(key, point, value)
+
+    def _tile(self, key, point, value):
+        """adds key, located at point, with value to the aggregates of
+        the tiles holding it at every zoom level"""
+        for zoom, row, column in tile_path(*point):
+            aggregate = self.__tiles.setdefault(zoom, {}).setdefault(
+                (row, column), [0, 0, 0, key])
+            aggregate[0] += 1
+            if value is not None:
+                aggregate[1] += value
+                aggregate[2] += 1
+            if aggregate[3] is not None and key < aggregate[3]:
+                aggregate[3] = key
+        self.__tiled[key] = point + (value,)
+
+    def _untile(self, key):
+        """removes key from the aggregates of the tiles holding it. Tiles
+        whose smallest key it was get theirs looked up again when read."""
+        entry = self.__tiled.pop(key, None)
+        if entry is None:
+            return
+        latitude, longitude, value = entry
+        for zoom, row, column in tile_path(latitude, longitude):
+            tiles = self.__tiles[zoom]
+            position = (row, column)
+            aggregate = tiles[position]
+            aggregate[0] -= 1
+            if aggregate[0] == 0:
+                del tiles[position]
+                continue
+            if value is not None:
+                aggregate[1] -= value
+                aggregate[2] -= 1
+            if aggregate[3] == key:
+                aggregate[3] = None
+
+    def _first(self, zoom, row, column):
+        """returns the smallest key of a tile, looking it up in the tiles
+        it is made of, or in the grid at MAX_ZOOM, when it was removed"""
+        aggregate = self.__tiles[zoom][(row, column)]
+        if aggregate[3] is None:
+            if zoom == MAX_ZOOM:
+                west, south, east, north = tile_box(zoom, row, column)
+                margin = 1e-9
+                keys = self._box_filter(south - margin, north + margin,
+                                        [(west - margin, east + margin)])[1]()
+                aggregate[3] = min(
+                    key for key in keys
+                    if tile(zoom, *self.__tiled[key][:2]) == (row, column))
+            else:
+                tiles = self.__tiles[zoom + 1]
+                aggregate[3] = min(
+                    self._first(zoom + 1, r, c)
+                    for r in (2 * row, 2 * row + 1)
+                    for c in (2 * column, 2 * column + 1)
+                    if (r, c) in tiles)
+        return aggregate[3]
+
+    def _unlocate(self, key):
+        """removes key from the spatial grid"""
+        self._untile(key)
+        point = self.__located.pop(key, None)
+        if point is None:
+            return
+        cell = self._cell(*point)
+        bucket = self.__grid.get(cell)
+        if bucket is not None:
+            bucket.pop(key, None)
+            if not bucket:
+                del self.__grid[cell]
+
+    def attribute_changed(self, obj, name):
+        """records and re-indexes a stored obj after an attribute was set"""
+        key = "{}.{}".format(obj.__class__.__name__, obj.__dict__.get("id"))
+        if self.__objects.get(key) is not obj:
+            return
+        self.__changes[key] = obj
+        if name in self.__relations.get(obj.__class__.__name__, ()):
+            self._index(key, obj)
+        if name in self.__ranks.get(obj.__class__.__name__, ()):
+            self._rank(key, obj)
+        if name in self.__spatial.get(obj.__class__.__name__, ()) or \
+                name == self.__averaged.get(obj.__class__.__name__):
+            self._locate(key, obj)
+
+    def related(self, cls, attr, value):
+        """returns the objects of cls whose foreign key attr equals value"""
+        index = self.__indexes.get((self._class_name(cls), attr), {})
+        return [self._fetch(key) for key in list(index.get(value, ()))
+                if self._contains(key)]
+
+    def _contains(self, key):
+        """tells if key is stored, built or not"""
+        return key in self.__objects or \
+            key in self.__raw.get(key.split(".", 1)[0], ())
+
+    def _fetch(self, key):
+        """returns the object stored under key, building it if needed"""
+        obj = self.__objects.get(key)
+        if obj is None:
+            with self.__lock:
+                obj = self.__objects.get(key)
+                raw = self.__raw.get(key.split(".", 1)[0], {})
+                if obj is None and key in raw:
+                    record = raw.pop(key)
+                    obj = classes[record["__class__"]].from_record(record)
+                    self._add(key, obj)
+        return obj
+
+    def all(self, cls=None, load=None):
+        """returns the dictionary __objects. load is accepted for parity
+        with DBStorage: relationships are answered from the indexes"""
         if cls is not None:
-            new_dict = {}
-            for key, value in self.__objects.items():
-                if cls == value.__class__ or cls == value.__class__.__name__:
-                    new_dict[key] = value
-            return new_dict
+            for key in list(self.__raw.get(self._class_name(cls), ())):
+                self._fetch(key)
+            return dict(self._partition(cls))
+        for raw in list(self.__raw.values()):
+            for key in list(raw):
+                self._fetch(key)
         return self.__objects
 
+    def iter(self, cls=None, batch_size=1000, load=None):
+        """yields the objects of cls, or of every class, without building
+        a dictionary of them. Only the keys are copied up front, and the
+        objects not built yet are built batch_size at a time. load is
+        accepted for parity with DBStorage, like in all()"""
+        names = list(classes) if cls is None else [self._class_name(cls)]
+        for name in names:
+            keys = list(self._partition(name))
+            keys.extend(self.__raw.get(name, ()))
+            for start in range(0, len(keys), batch_size):
+                for key in keys[start:start + batch_size]:
+                    obj = self._fetch(key)
+                    if obj is not None:
+                        yield obj
+
+    def find(self, cls, where=None, order_by=None, limit=None, offset=0,
+             load=None):
+        """returns the objects of cls matching where, sorted by order_by,
+        then sliced by offset and limit. where maps attributes, optionally
+        suffixed by __in, __gt, __gte, __lt or __lte, to the value they are
+        compared to. order_by is an attribute or a list of them, prefixed
+        by "-" to sort from the largest. Equality and __in filters on
+        foreign keys are answered from the indexes, and a limited sort
+        only keeps the first offset + limit objects."""
+        cls_name = self._class_name(cls)
+        tests = []
+        keys = None
+        for name, value in (where or {}).items():
+            attr, _, op = name.partition("__")
+            tests.append((attr, operators[op], value))
+            if op in ("", "in") and attr not in self.__many and \
+                    attr in self.__relations.get(cls_name, ()):
+                index = self.__indexes.get((cls_name, attr), {})
+                values = set(value) if op else (value,)
+                buckets = [index[v] for v in values if v in index]
+                if keys is None or sum(map(len, buckets)) < len(keys):
+                    keys = [key for bucket in buckets for key in bucket]
+        if keys is None:
+            keys = list(self._partition(cls_name))
+            keys.extend(self.__raw.get(cls_name, ()))
+        found = (obj for obj in map(self._fetch, keys)
+                 if obj is not None and self._matches(obj, tests))
+        if order_by is None:
+            stop = None if limit is None else offset + limit
+            return list(islice(found, offset, stop))
+        key = self._sort_key(order_by)
+        if limit is None:
+            return sorted(found, key=key)[offset:]
+        return heapq.nsmallest(offset + limit, found, key=key)[offset:]
+
+    @staticmethod
+    def _matches(obj, tests):
+        """tells if obj passes every (attribute, operator, value) test"""
+        for attr, test, value in tests:
+            try:
+                if not test(getattr(obj, attr, None), value):
+                    return False
+            except TypeError:
+                return False
+        return True
+
+    @staticmethod
+    def _sort_key(order_by):
+        """returns the sort key function for order_by, sorting None last"""
+        if isinstance(order_by, str):
+            order_by = [order_by]
+        fields = [(field.lstrip("-"), field.startswith("-"))
+                  for field in order_by]
+
+        def key(obj):
+            """returns the sort key of obj"""
+            values = []
+            for attr, descending in fields:
+                value = getattr(obj, attr, None)
+                values.append(value is None)
+                if value is None:
+                    value = 0
+                values.append(_Descending(value) if descending else value)
+            return values
+        return key
+
+    def search_places(self, states=None, cities=None, amenities=None,
+                      limit=None, offset=0, ranges=None, order_by=None,
+                      bbox=None, radius=None, nearest=None):
+        """returns the places located in one of the states or cities, or
+        anywhere when neither is given, having every amenity in amenities
+        and, for each attr: (low, high) of ranges, a numeric attr between
+        low and high included (None for no bound). bbox, (west, south,
+        east, north), keeps the places inside the box and radius,
+        (latitude, longitude, km), the places within km of the point.
+        Places are sorted by order_by, an attribute of __ranks prefixed
+        with "-" for descending order, then by id, places missing it last,
+        or by id only, then sliced by offset and limit. nearest, (place
+        id, k), instead keeps the k places closest to the place, sorted by
+        distance. The filters are answered from the indexes, starting from
+        the one matching the fewest places, so the time spent grows with
+        the size of the smallest filter rather than with the number of
+        places."""
+        city_index = self.__indexes.get(("City", "state_id"), {})
+        place_index = self.__indexes.get(("Place", "city_id"), {})
+        amenity_index = self.__indexes.get(("Place", "amenity_ids"), {})
+        filters = []
+        if states or cities:
+            city_ids = set(cities or ())
+            for state_id in set(states or ()):
+                city_ids.update(key.split(".", 1)[1]
+                                for key in city_index.get(state_id, ()))
+            buckets = [place_index[city_id] for city_id in city_ids
+                       if city_id in place_index]
+            position = self.__relations["Place"].index("city_id")
+
+            def in_cities(key):
+                """tells if the place stored under key is in city_ids"""
+                values = self.__indexed.get(key)
+                return values is not None and values[position] in city_ids
+            filters.append((sum(map(len, buckets)),
+                            lambda: chain.from_iterable(buckets), in_cities))
+        for amenity_id in set(amenities or ()):
+            bucket = amenity_index.get(amenity_id, {})
+            filters.append((len(bucket), bucket.__iter__,
+                            bucket.__contains__))
+        for attr, (low, high) in (ranges or {}).items():
+            filters.append(self._range_filter(attr, low, high))
+        if bbox is not None:
+            west, south, east, north = bbox
+            filters.append(self._box_filter(south, north,
+                                            longitudes(west, east)))
+        if radius is not None:
+            filters.append(self._box_filter(*radius_box(*radius),
+                                            circle=radius))
+        filters.sort(key=lambda f: f[0])
+        stop = None if limit is None else offset + limit
+        if nearest is not None:
+            keys = self._nearest(filters, *nearest)
+        elif order_by is None:
+            keys = self._filtered(filters)
+            keys.sort()
+        else:
+            keys = self._ordered(filters, order_by, stop)
+        places = (self._fetch(key) for key in keys[offset:stop])
+        return [place for place in places if place is not None]
+
+    def _range_filter(self, attr, low, high):
+        """returns the size, members and test of the filter keeping the
+        places whose numeric attr is between low and high included"""
+        index = self.__ordered.get(("Place", attr), _SortedIndex())
+        start, stop = index.span(low, high)
+        position = self.__ranks["Place"].index(attr)
+
+        def in_range(key):
+            """tells if the value of attr of key is between low and high"""
+            value = self.__ranked.get(key, (None,) * (position + 1))[position]
+            return value is not None and \
+                (low is None or value >= low) and \
+                (high is None or value <= high)
+        return (stop - start, lambda: islice(index.keys, start, stop),
+                in_range)
+
+    def _box_filter(self, south, north, spans, circle=None):
+        """returns the size, members and test of the filter keeping the
+        places located between the south and north latitudes and in one
+        of the (west, east) longitude spans, and within km of the point
+        when circle, (latitude, longitude, km), is given. The members are
+        read from the cells of __grid overlapping the box, or from every
+        occupied cell when there are fewer of them."""
+        size = self.__cell_size
+        rows = range(floor(south / size), floor(north / size) + 1)
+        columns = [range(floor(west / size), floor(east / size) + 1)
+                   for west, east in spans]
+        if len(rows) * sum(map(len, columns)) > len(self.__grid):
+            buckets = [bucket for (row, column), bucket in self.__grid.items()
+                       if row in rows and any(column in c for c in columns)]
+        else:
+            buckets = [self.__grid[(row, column)] for row in rows
+                       for c in columns for column in c
+                       if (row, column) in self.__grid]
+
+        def inside(key):
+            """tells if the place stored under key is inside the box"""
+            point = self.__located.get(key)
+            if point is None or not south <= point[0] <= north or \
+                    not any(w <= point[1] <= e for w, e in spans):
+                return False
+            return circle is None or \
+                distance(point[0], point[1], *circle[:2]) <= circle[2]
+        return (sum(map(len, buckets)),
+                lambda: filter(inside, chain.from_iterable(buckets)), inside)
+
+    def _nearest(self, filters, place_id, k):
+        """returns the keys of the k places passing every filter closest
+        to the place of place_id, sorted by distance then key. The radius
+        searched starts at one cell and doubles until k places are found
+        or it spans the whole globe."""
+        own = "Place." + place_id
+        origin = self.__located.get(own)
+        if origin is None or k <= 0:
+            return []
+        km = radians(self.__cell_size) * EARTH_RADIUS
+        while True:
+            circle = origin + (km,)
+            found = self._filtered(sorted(
+                filters + [self._box_filter(*radius_box(*circle),
+                                            circle=circle)],
+                key=lambda f: f[0]))
+            found = [key for key in found if key != own]
+            if len(found) >= k or km >= pi * EARTH_RADIUS:
+                break
+            km *= 2
+        return heapq.nsmallest(k, found, key=lambda key: (
+            distance(*origin, *self.__located[key]), key))
+
+    def clusters(self, bbox, zoom):
+        """returns the aggregates of the places of the tiles of zoom, at
+        most MAX_ZOOM, overlapping bbox, (west, south, east, north): the box
+        of the tile, its number of places, their average price and the id
+        of its first place. The aggregates are kept up to date as places
+        are added, moved or removed, so only the tiles returned are read."""
+        zoom = min(max(zoom, 0), MAX_ZOOM)
+        west, south, east, north = bbox
+        rows, columns = tile_ranges(zoom, south, north,
+                                    longitudes(west, east))
+        tiles = self.__tiles.get(zoom, {})
+        if len(rows) * sum(map(len, columns)) > len(tiles):
+            positions = sorted(
+                (row, column) for row, column in tiles
+                if row in rows and any(column in c for c in columns))
+        else:
+            positions = sorted((row, column) for row in rows
+                               for c in columns for column in c
+                               if (row, column) in tiles)
+        result = []
+        for row, column in positions:
+            count, total, priced, _ = tiles[(row, column)]
+            key = self._first(zoom, row, column)
+            result.append(cluster(zoom, row, column, count, total, priced,
+                                  key.split(".", 1)[1]))
+        return result
+
+    def _filtered(self, filters):
+        """returns the keys of the places passing every filter, scanning
+        the members of the first one and probing the others"""
+        if not filters:
+            keys = list(self._partition(Place))
+            keys.extend(self.__raw.get("Place", ()))
+            return keys
+        tests = [test for _, _, test in filters[1:]]
+        return [key for key in list(filters[0][1]())
+                if all(test(key) for test in tests)]
+
+    def _ordered(self, filters, order_by, stop):
+        """returns the keys of the places passing every filter sorted by
+        order_by, at least the first stop of them when stop is not None.
+        Without filters, or when the wanted places should come up early,
+        the sorted index is walked in order; otherwise the matching places
+        are collected and the first stop of them picked with a heap."""
+        reverse = order_by.startswith("-")
+        attr = order_by.lstrip("-")
+        position = self.__ranks["Place"].index(attr)
+        index = self.__ordered.get(("Place", attr), _SortedIndex())
+        total = len(index.keys) + len(index.missing)
+        if not filters or stop is not None and \
+                stop * total < filters[0][0] ** 2:
+            walk = chain(reversed(index.keys) if reverse else index.keys,
+                         sorted(index.missing))
+            tests = [test for _, _, test in filters]
+            return list(islice((key for key in walk
+                                if all(test(key) for test in tests)), stop))
+
+        def sort_key(key):
+            """sorts by the value of attr then by key, missing values last"""
+            value = self.__ranked.get(key, (None,) * (position + 1))[position]
+            if value is None:
+                return (True, key)
+            if reverse:
+                return (False, _Descending((value, key)))
+            return (False, (value, key))
+        keys = self._filtered(filters)
+        if stop is None:
+            return sorted(keys, key=sort_key)
+        return heapq.nsmallest(stop, keys, key=sort_key)
+
     def new(self, obj):
         """sets in __objects the obj with key <obj class name>.id"""
         if obj is not None:
             key = obj.__class__.__name__ + "." + obj.id
-            self.__objects[key] = obj
+            self._add(key, obj)
+            self.__changes[key] = obj
+
+    def _add(self, key, obj, pending=None):
+        """stores obj under key in __objects, its partition and indexes.
+        The indexes already holding its current values are left as they
+        are, such as those of a record built on first access."""
+        self.__objects[key] = obj
+        self.__partitions.setdefault(obj.__class__.__name__, {})[key] = obj
+        self._index(key, obj)
+        self._rank(key, obj, pending)
+        self._locate(key, obj)
+
+    def _remove(self, key):
+        """removes key from __objects, its partition and indexes"""
+        cls_name = key.split(".", 1)[0]
+        if self.__objects.pop(key, None) is None:
+            self.__raw.get(cls_name, {}).pop(key, None)
+        self.__partitions.get(cls_name, {}).pop(key, None)
+        self._unindex(key)
+        self._unrank(key)
+        self._unlocate(key)
 
     def save(self):
-        """serializes __objects to the JSON file (path: __file_path)"""
-        json_objects = {}
-        for key in self.__objects:
-            json_objects[key] = self.__objects[key].to_dict()
-        with open(self.__file_path, 'w') as f:
-            json.dump(json_objects, f)
+        """serializes __objects to the JSON file (path: __file_path)
+        or, in journal mode, appends the changed objects to the journal.
+        With group commit the write is deferred and shared with the other
+        saves of the same window or request."""
+        if not self.__group_commit:
+            self._commit()
+            return
+        with self.__lock:
+            if not FileStorage.__pending:
+                FileStorage.__pending = True
+                atexit.register(self.flush)
+            if self.__group_commit != "request" and self.__timer is None:
+                timer = threading.Timer(float(self.__group_commit),
+                                        self.flush)
+                FileStorage.__timer = timer
+                timer.start()
+
+    def flush(self):
+        """writes the pending changes and returns once they are on disk"""
+        self._commit(sync=True)
+
+    def _commit(self, sync=False):
+        """writes the changes made since the last save"""
+        with self.__lock:
+            if self.__timer is not None:
+                self.__timer.cancel()
+                FileStorage.__timer = None
+            if FileStorage.__pending:
+                FileStorage.__pending = False
+                atexit.unregister(self.flush)
+            if not self.__journal:
+                self.compact(sync)
+                return
+            changes = self.__changes
+            FileStorage.__changes = {}
+            lines = []
+            for key, obj in changes.items():
+                if obj is None:
+                    record = {"op": "delete", "key": key}
+                    self.__versions.pop(key, None)
+                else:
+                    record = {"op": "put", "key": key, "obj": obj.to_dict()}
+                    self.__versions[key] = record["obj"].get("updated_at")
+                lines.append(json.dumps(record) + "\n")
+            if not lines:
+                return
+            with open(self.__journal_path, 'a') as f:
+                stat = os.fstat(f.fileno())
+                f.write("".join(lines))
+                if sync:
+                    f.flush()
+                    os.fsync(f.fileno())
+                size = f.tell()
+            inode, offset = self.__journal_pos
+            if stat.st_size == offset and inode in (None, stat.st_ino):
+                FileStorage.__journal_pos = (stat.st_ino, size)
+            if size > self.__journal_limit:
+                self.compact(sync)
+
+    def compact(self, sync=False):
+        """writes every object to a new snapshot and empties the journal"""
+        with self.__lock:
+            json_objects = {}
+            for key, obj in list(self.__objects.items()):
+                json_objects[key] = obj.to_dict()
+            for raw in list(self.__raw.values()):
+                json_objects.update(raw)
+            FileStorage.__changes = {}
+            tmp_path = self.__file_path + ".tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(json_objects, f)
+                if sync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, self.__file_path)
+            if os.path.exists(self.__journal_path):
+                os.remove(self.__journal_path)
+            FileStorage.__snapshot = self._signature(self.__file_path)
+            FileStorage.__journal_pos = (None, 0)
+            FileStorage.__versions = {key: value.get("updated_at")
+                                      for key, value in json_objects.items()}
+
+    @staticmethod
+    def _signature(path):
+        """returns the inode, size and mtime of path, None if missing"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
 
     def reload(self):
-        """deserializes the JSON file to __objects"""
+        """deserializes the JSON file to __objects, then replays the
+        changes recorded in the journal. Nothing is read when neither
+        file changed since the last load or write, and only the objects
+        whose records changed are rebuilt. A file that cannot be read or
+        decoded leaves the objects as they are, to be read again by the
+        next reload."""
+        with self.__lock:
+            snapshot = self._signature(self.__file_path)
+            if snapshot != self.__snapshot:
+                try:
+                    with open(self.__file_path, 'r') as f:
+                        records = json.load(f)
+                except FileNotFoundError:
+                    records = {}
+                except (OSError, ValueError):
+                    return
+                entries = self._read_journal(None, 0)
+                for entry in entries:
+                    if entry["op"] == "put":
+                        records[entry["key"]] = entry["obj"]
+                    else:
+                        records.pop(entry["key"], None)
+                self._merge(records)
+                for key in [k for k in self.__versions if k not in records]:
+                    del self.__versions[key]
+                    if self._contains(key) and key not in self.__changes:
+                        self._remove(key)
+                FileStorage.__snapshot = snapshot
+            else:
+                for entry in self._read_journal(*self.__journal_pos):
+                    if entry["op"] == "put":
+                        self._merge({entry["key"]: entry["obj"]})
+                    else:
+                        self.__versions.pop(entry["key"], None)
+                        if self._contains(entry["key"]) and \
+                                entry["key"] not in self.__changes:
+                            self._remove(entry["key"])
+
+    def _read_journal(self, inode, offset):
+        """returns the complete journal records past offset, restarting
+        from the beginning if the journal is not the one of inode"""
         try:
-            with open(self.__file_path, 'r') as f:
-                jo = json.load(f)
-            for key in jo:
-                self.__objects[key] = classes[jo[key]["__class__"]](**jo[key])
-        except Exception:
-            pass
+            with open(self.__journal_path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                if stat.st_ino != inode or stat.st_size < offset:
+                    offset = 0
+                f.seek(offset)
+                data = f.read()
+        except OSError:
+            FileStorage.__journal_pos = (None, 0)
+            return []
+        end = data.rfind(b"\n") + 1
+        entries = []
+        for line in data[:end].splitlines():
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                break
+        FileStorage.__journal_pos = (stat.st_ino, offset + end)
+        return entries
+
+    def _merge(self, records):
+        """rebuilds the objects whose record differs from the version
+        held in __objects, leaving those with changes not written yet.
+        In lazy mode the records of objects not built yet are only kept,
+        to be built on first access. The sorted indexes are sorted once
+        for all the records."""
+        pending = {}
+        for key, record in records.items():
+            if key in self.__changes:
+                continue
+            version = record.get("updated_at")
+            if self._contains(key) and self.__versions.get(key) == version:
+                continue
+            cls_name = record.get("__class__")
+            if cls_name not in classes:
+                continue
+            if self.__lazy and key not in self.__objects:
+                self.__raw.setdefault(cls_name, {})[key] = record
+                self._index(key, record)
+                self._rank(key, record, pending)
+                self._locate(key, record)
+            else:
+                try:
+                    obj = classes[cls_name].from_record(record)
+                except Exception:
+                    continue
+                self._add(key, obj, pending)
+            self.__versions[key] = version
+        for name, pairs in pending.items():
+            self.__ordered.setdefault(name, _SortedIndex()).add_many(pairs)
+
+    def bulk_new(self, objs):
+        """adds many objects to __objects and saves them in one write"""
+        for obj in objs:
+            self.new(obj)
+        self.save()
+
+    def bulk_update(self, cls, changes):
+        """applies changes, a dictionary of id -> {attribute: value}, to
+        the objects of cls and saves them in one write. Returns the number
+        of objects updated."""
+        now = datetime.utcnow()
+        count = 0
+        for id, attrs in changes.items():
+            obj = self.get(cls, id)
+            if obj is None:
+                continue
+            for key, value in attrs.items():
+                if key not in ("id", "created_at", "updated_at",
+                               "__class__"):
+                    setattr(obj, key, value)
+            obj.updated_at = now
+            count += 1
+        self.save()
+        return count
+
+    def bulk_delete(self, cls, ids):
+        """deletes the objects of cls with the given ids and saves in one
+        write. Returns the number of objects deleted."""
+        count = 0
+        for obj in list(self.get_many(cls, ids).values()):
+            self.delete(obj)
+            count += 1
+        self.save()
+        return count
 
     def delete(self, obj=None):
         """delete obj from __objects if it’s inside"""
         if obj is not None:
             key = obj.__class__.__name__ + '.' + obj.id
             if key in self.__objects:
-                del self.__objects[key]
+                self._remove(key)
+            self.__changes[key] = None
 
     def close(self):
-        """call reload() method for deserializing the JSON file to objects"""
+        """writes the pending saves when they are grouped by request, then
+        calls reload() method for deserializing the JSON file to objects"""
+        if self.__pending and self.__group_commit == "request":
+            self.flush()
         self.reload()
 
-    def get(self, cls, id):
+    def get(self, cls, id, load=None):
         """Returns the requested obj based on its class and id."""
         if cls and id:
-            key = "{}.{}".format(cls.__name__, id)
-            if key in self.__objects:
-                return self.__objects[key]
+            key = "{}.{}".format(self._class_name(cls), id)
+            obj = self._partition(cls).get(key)
+            if obj is None and self.__raw:
+                obj = self._fetch(key)
+            return obj
         return None
 
+    def get_many(self, cls, ids, load=None):
+        """Returns the objects of a class with the given ids, keyed like
+        all()"""
+        new_dict = {}
+        for id in ids:
+            obj = self.get(cls, id)
+            if obj is not None:
+                new_dict["{}.{}".format(self._class_name(cls), id)] = obj
+        return new_dict
+
     def count(self, cls=None):
         """Counts the number of object for a specified class
         Otherwise returns the total number of objects."""
         if cls is None:
-            dct = self.all()
-        else:
-            dct = self.all(cls)
-        num_objs = len(dct)
-        return num_objs
+            return len(self.__objects) + \
+                sum(len(raw) for raw in self.__raw.values())
+        cls_name = self._class_name(cls)
+        return len(self._partition(cls_name)) + \
+            len(self.__raw.get(cls_name, ()))
+
+    def counts(self, clss=None):
+        """Counts the objects of several classes, all of them by default.
+        Returns a dictionary keyed by class name."""
+        if clss is None:
+            clss = list(classes)
+        return {self._class_name(cls): self.count(cls) for cls in clss}
@@ -0,0 +1,103 @@
+#!/usr/bin/python3
+"""
+Contains the great-circle and map tile helpers shared by the storage
+engines
+"""
+
+from math import asin, cos, degrees, radians, sin, sqrt, pi
+
+# float - mean radius of the Earth in km
+EARTH_RADIUS = 6371.0088
+# integer - deepest zoom level places are aggregated at, its tiles being
+# 360 / 2 ** MAX_ZOOM degrees (about 10 km) wide
+MAX_ZOOM = 12
+
+
+def coordinates(latitude, longitude):
+    """returns latitude and longitude as a tuple when both are numbers of
+    the valid ranges, None otherwise"""
+    for value in (latitude, longitude):
+        if type(value) not in (int, float) or value != value:
+            return None
+    if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+        return None
+    return (latitude, longitude)
+
+
+def distance(lat1, lon1, lat2, lon2):
+    """returns the great-circle distance between two points in km"""
+    lat1, lon1, lat2, lon2 = map(radians, (lat1, lon1, lat2, lon2))
+    h = sin((lat2 - lat1) / 2) ** 2 + \
+        cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * asin(min(1.0, sqrt(h)))
+
+
+def longitudes(west, east):
+    """returns the (west, east) ranges of longitudes between west and east
+    going east, split in two when crossing the antimeridian"""
+    if west <= east:
+        return [(west, east)]
+    return [(west, 180.0), (-180.0, east)]
+
+
+def radius_box(latitude, longitude, km):
+    """returns the south and north latitudes and the longitude ranges of
+    the smallest box holding every point within km of the given point"""
+    angle = km / EARTH_RADIUS
+    south = max(-90.0, latitude - degrees(angle))
+    north = min(90.0, latitude + degrees(angle))
+    if south == -90 or north == 90 or angle >= pi / 2:
+        return south, north, [(-180.0, 180.0)]
+    spread = degrees(asin(min(1.0, sin(angle) / cos(radians(latitude)))))
+    if spread >= 180:
+        return south, north, [(-180.0, 180.0)]
+    west, east = longitude - spread, longitude + spread
+    if west < -180:
+        west += 360
+    if east > 180:
+        east -= 360
+    return south, north, longitudes(west, east)
+
+
+def tile(zoom, latitude, longitude):
+    """returns the row and column of the tile of zoom holding the point,
+    the tiles of zoom being 360 / 2 ** zoom degrees wide, counted from the
+    south-west corner"""
+    size = 360.0 / 2 ** zoom
+    rows = max(1, 2 ** zoom // 2)
+    return (min(int((latitude + 90) // size), rows - 1),
+            min(int((longitude + 180) // size), 2 ** zoom - 1))
+
+
+def tile_path(latitude, longitude):
+    """returns the zoom, row and column of the tiles holding the point at
+    every zoom level, each tile being made of four tiles of the next"""
+    row, column = tile(MAX_ZOOM, latitude, longitude)
+    return [(zoom, row >> (MAX_ZOOM - zoom), column >> (MAX_ZOOM - zoom))
+            for zoom in range(MAX_ZOOM + 1)]
+
+
+def tile_box(zoom, row, column):
+    """returns the [west, south, east, north] box of a tile of zoom"""
+    size = 360.0 / 2 ** zoom
+    return [column * size - 180, row * size - 90,
+            min(180.0, (column + 1) * size - 180),
+            min(90.0, (row + 1) * size - 90)]
+
+
+def tile_ranges(zoom, south, north, spans):
+    """returns the range of rows and the ranges of columns of the tiles of
+    zoom overlapping the box between the south and north latitudes and
+    the (west, east) longitude spans"""
+    rows = range(tile(zoom, south, 0)[0], tile(zoom, north, 0)[0] + 1)
+    columns = [range(tile(zoom, 0, west)[1], tile(zoom, 0, east)[1] + 1)
+               for west, east in spans]
+    return rows, columns
+
+
+def cluster(zoom, row, column, count, total, priced, place_id):
+    """returns the JSON representation of the aggregate of a tile: its box,
+    its number of places, their average price and the id of one of them"""
+    return {"bbox": tile_box(zoom, row, column), "count": count,
+            "average_price": total / priced if priced else None,
+            "place_id": place_id}
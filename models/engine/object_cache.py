@@ -0,0 +1,93 @@
+#!/usr/bin/python3
+"""
+Contains the class ObjectCache
+"""
+
+from collections import OrderedDict
+import threading
+import time
+
+
+class ObjectCache:
+    """least recently used cache whose entries expire after ttl seconds,
+    holding at most max_bytes worth of entries"""
+
+    def __init__(self, max_bytes, ttl):
+        """Instantiate an empty ObjectCache"""
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # OrderedDict - key -> (expiry time, size, value), oldest use first
+        self.__entries = OrderedDict()
+        # integer - sum of the sizes of the entries
+        self.__bytes = 0
+        # dictionary - hits, misses, evictions and expirations so far
+        self.__counters = {"hits": 0, "misses": 0, "evictions": 0,
+                           "expirations": 0}
+        # integer - number of invalidations so far
+        self.__generation = 0
+        self.__lock = threading.Lock()
+
+    def get(self, key):
+        """returns the value cached under key, None if missing or expired"""
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                self._pop(key)
+                self.__counters["expirations"] += 1
+                entry = None
+            if entry is None:
+                self.__counters["misses"] += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.__counters["hits"] += 1
+            return entry[2]
+
+    def generation(self):
+        """returns the number of invalidations so far, to be passed to
+        set() with the values read from then on"""
+        with self.__lock:
+            return self.__generation
+
+    def set(self, key, value, size, generation=None):
+        """caches value under key, evicting the least recently used
+        entries past max_bytes. Values larger than max_bytes, or read
+        before an invalidation when generation is given, are not
+        cached."""
+        with self.__lock:
+            if generation is not None and generation != self.__generation:
+                return
+            self._pop(key)
+            if size > self.max_bytes:
+                return
+            self.__entries[key] = (time.monotonic() + self.ttl, size, value)
+            self.__bytes += size
+            while self.__bytes > self.max_bytes:
+                self._pop(next(iter(self.__entries)))
+                self.__counters["evictions"] += 1
+
+    def invalidate(self, key):
+        """drops the value cached under key"""
+        with self.__lock:
+            self._pop(key)
+            self.__generation += 1
+
+    def clear(self):
+        """drops every cached value"""
+        with self.__lock:
+            self.__entries.clear()
+            self.__bytes = 0
+            self.__generation += 1
+
+    def _pop(self, key):
+        """removes the entry of key, if any, and its size"""
+        entry = self.__entries.pop(key, None)
+        if entry is not None:
+            self.__bytes -= entry[1]
+
+    def stats(self):
+        """returns the counters, the number of entries and their size"""
+        with self.__lock:
+            stats = dict(self.__counters)
+            stats.update(entries=len(self.__entries), bytes=self.__bytes,
+                         max_bytes=self.max_bytes, ttl=self.ttl)
+            return stats
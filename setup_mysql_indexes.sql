@@ -0,0 +1,15 @@
+-- adds the indexes declared by the models to a database created before them
+-- usage: cat setup_mysql_indexes.sql | mysql -uroot -p hbnb_dev_db
+-- the console command `migrate` does the same, skipping existing indexes
+
+CREATE INDEX ix_cities_state_id ON cities (state_id);
+CREATE INDEX ix_places_city_id ON places (city_id);
+CREATE INDEX ix_places_user_id ON places (user_id);
+CREATE INDEX ix_places_number_rooms ON places (number_rooms);
+CREATE INDEX ix_places_number_bathrooms ON places (number_bathrooms);
+CREATE INDEX ix_places_max_guest ON places (max_guest);
+CREATE INDEX ix_places_price_by_night ON places (price_by_night);
+CREATE INDEX ix_places_latitude_longitude ON places (latitude, longitude);
+CREATE INDEX ix_reviews_place_id ON reviews (place_id);
+CREATE INDEX ix_reviews_user_id ON reviews (user_id);
+CREATE INDEX ix_place_amenity_amenity_id ON place_amenity (amenity_id);
@@ -2,6 +2,7 @@
 """Test BaseModel for expected behavior and documentation"""
 from datetime import datetime
 import inspect
+import json
 import models
 import pep8 as pycodestyle
 import time
@@ -138,6 +139,29 @@ class TestBaseModel(unittest.TestCase):
         self.assertEqual(new_d["created_at"], bm.created_at.strftime(t_format))
         self.assertEqual(new_d["updated_at"], bm.updated_at.strftime(t_format))
 
+    def test_from_record(self):
+        """Test that from_record builds the same instance as __init__"""
+        bm = BaseModel()
+        bm.name = "Holberton"
+        record = bm.to_dict()
+        for inst in [BaseModel(**record), BaseModel.from_record(record)]:
+            with self.subTest(inst=inst):
+                self.assertIs(type(inst), BaseModel)
+                self.assertEqual(list(inst.__dict__), list(bm.__dict__))
+                self.assertEqual(inst.__dict__, bm.__dict__)
+                self.assertEqual(inst.to_dict(), record)
+        self.assertEqual(record["__class__"], "BaseModel")
+
+    def test_to_json(self):
+        """Test that to_json caches the encoding until an attribute is set"""
+        bm = BaseModel()
+        encoded = bm.to_json()
+        self.assertEqual(json.loads(encoded.decode()), bm.to_dict())
+        self.assertIs(bm.to_json(), encoded)
+        bm.name = "Holberton"
+        self.assertEqual(json.loads(bm.to_json().decode())["name"],
+                         "Holberton")
+
     def test_str(self):
         """test that the str method has the correct output"""
         inst = BaseModel()
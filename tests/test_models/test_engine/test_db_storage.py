@@ -17,7 +17,11 @@ from models.user import User
 import json
 import os
 import pep8
+import re
+from sqlalchemy import create_engine
+import tempfile
 import unittest
+from unittest import mock
 DBStorage = db_storage.DBStorage
 classes = {"Amenity": Amenity, "City": City, "Place": Place,
            "Review": Review, "State": State, "User": User}
@@ -115,3 +119,427 @@ class TestDBStorage(unittest.TestCase):
         user_obj.save()
         self.assertEqual(models.storage.count("State"), initial_count + 1)
         self.assertEqual(models.storage.count(), initial_count + 2)
+
+    @unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') != 'db',
+                     "not testing db storage")
+    def test_get_many(self):
+        """Test that get_many fetches a batch of ids by key"""
+        state_obj = State(name="Kisii")
+        state_obj.save()
+        other_obj = State(name="Nyeri")
+        other_obj.save()
+        found = models.storage.get_many(State, [state_obj.id, other_obj.id,
+                                                "Timi"])
+        self.assertEqual(found, {"State." + state_obj.id: state_obj,
+                                 "State." + other_obj.id: other_obj})
+        self.assertEqual(models.storage.get_many("Timi", ["Timi"]), {})
+
+    @unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') != 'db',
+                     "not testing db storage")
+    def test_counts(self):
+        """Test that counts returns the count of each class by name"""
+        counts = models.storage.counts()
+        self.assertEqual(set(counts), set(classes))
+        self.assertEqual(sum(counts.values()), models.storage.count())
+        State(name="Kisii").save()
+        counts_after = models.storage.counts([State, "Timi"])
+        self.assertEqual(counts_after, {"State": counts["State"] + 1,
+                                        "Timi": 0})
+
+    @unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') != 'db',
+                     "not testing db storage")
+    def test_all_load(self):
+        """Test that all and get load the requested relationships"""
+        state_obj = State(name="Kisii")
+        state_obj.save()
+        City(name="Ogembo", state_id=state_obj.id).save()
+        models.storage.close()
+        states = models.storage.all(State, load=["cities.places"])
+        state = states["State." + state_obj.id]
+        self.assertIn("cities", state.__dict__)
+        self.assertIn("places", state.cities[0].__dict__)
+        models.storage.close()
+        state = models.storage.get(State, state_obj.id, load=["cities"])
+        self.assertEqual([c.name for c in state.__dict__["cities"]],
+                         ["Ogembo"])
+        models.storage.delete(state.cities[0])
+        models.storage.delete(state)
+        models.storage.save()
+
+    @unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') != 'db',
+                     "not testing db storage")
+    def test_bulk(self):
+        """Test bulk_new, bulk_update and bulk_delete"""
+        initial_count = models.storage.count(State)
+        states = [State(name=str(i)) for i in range(3)]
+        models.storage.bulk_new(states)
+        self.assertEqual(models.storage.count(State), initial_count + 3)
+        count = models.storage.bulk_update(State, {
+            states[0].id: {"name": "Nairobi"}, "Timi": {"name": "Kisumu"}})
+        self.assertEqual(count, 1)
+        self.assertEqual(models.storage.get(State, states[0].id).name,
+                         "Nairobi")
+        ids = [state.id for state in states]
+        self.assertEqual(models.storage.bulk_delete(State, ids + ["Timi"]),
+                         3)
+        self.assertEqual(models.storage.count(State), initial_count)
+
+    @unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') != 'db',
+                     "not testing db storage")
+    def test_iter(self):
+        """Test that iter yields the same objects as all"""
+        State(name="Kisii").save()
+        ids = [obj.id for obj in models.storage.iter(State, batch_size=1)]
+        self.assertCountEqual(ids, [obj.id for obj in
+                                    models.storage.all(State).values()])
+        self.assertEqual(len(list(models.storage.iter())),
+                         models.storage.count())
+
+    @unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') != 'db',
+                     "not testing db storage")
+    def test_find(self):
+        """Test that find filters, sorts and slices in SQL"""
+        state_obj = State(name="Kisii")
+        state_obj.save()
+        for name in ["Ogembo", "Keroka", "Suneka"]:
+            City(name=name, state_id=state_obj.id).save()
+        find = models.storage.find
+        cities = find(City, {"state_id": state_obj.id}, order_by="-name")
+        self.assertEqual([c.name for c in cities],
+                         ["Suneka", "Ogembo", "Keroka"])
+        cities = find("City", {"state_id__in": [state_obj.id, "Timi"],
+                               "name__gte": "L"},
+                      order_by="name", limit=1, offset=1)
+        self.assertEqual([c.name for c in cities], ["Suneka"])
+        self.assertEqual(find("Timi"), [])
+
+    @unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') != 'db',
+                     "not testing db storage")
+    def test_indexes_script(self):
+        """Test that setup_mysql_indexes.sql creates the model indexes"""
+        with open("setup_mysql_indexes.sql") as f:
+            script = re.findall(r"CREATE INDEX (\w+) ON (\w+) \(([\w, ]+)\)",
+                                f.read())
+        indexes = [(index.name, table.name,
+                    ", ".join(column.name for column in index.columns))
+                   for table in models.base_model.Base.metadata.sorted_tables
+                   for index in table.indexes]
+        self.assertCountEqual(script, indexes)
+        self.assertEqual(models.storage.migrate(), [])
+
+    @unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') != 'db',
+                     "not testing db storage")
+    def test_pool_stats(self):
+        """Test that pool_stats reports the pool and its events"""
+        models.storage.count(State)
+        stats = models.storage.pool_stats()
+        self.assertIn("pool", stats)
+        self.assertGreaterEqual(stats["connects"], 1)
+        self.assertGreaterEqual(stats["checkouts"], stats["connects"])
+
+    @unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') != 'db',
+                     "not testing db storage")
+    def test_clusters(self):
+        """Test that the tile aggregates follow the places written through
+        the session and the bulk methods, and are rebuilt by migrate"""
+        state_obj = State(name="Lamu")
+        state_obj.save()
+        city_obj = City(name="Shela", state_id=state_obj.id)
+        city_obj.save()
+        user_obj = User(email="tiles@gmail.com", password="pwd")
+        user_obj.save()
+        places = [Place(name=str(i), city_id=city_obj.id, user_id=user_obj.id,
+                        latitude=0.5, longitude=longitude,
+                        price_by_night=price)
+                  for i, (longitude, price) in enumerate([(1.0, 10),
+                                                          (1.1, 20),
+                                                          (2.0, 30)])]
+        for place in places:
+            place.save()
+        storage = models.storage
+        box = (0.5, 0, 2.5, 1)
+
+        def tiles():
+            """Return the count, average price and place id of the tiles"""
+            return [(c["count"], c["average_price"], c["place_id"])
+                    for c in storage.clusters(box, 6)]
+        ids = sorted(p.id for p in places)
+        self.assertEqual(tiles(), [(3, 20, ids[0])])
+        places[2].longitude = 100.0
+        places[0].price_by_night = 40
+        places[0].save()
+        places[2].save()
+        self.assertEqual(tiles(), [(2, 30, min(places[0].id, places[1].id))])
+        first = min(places[:2], key=lambda p: p.id)
+        storage.delete(first)
+        storage.save()
+        other = places[1] if first is places[0] else places[0]
+        self.assertEqual(tiles(), [(1, other.price_by_night, other.id)])
+        added = [Place(name="bulk", city_id=city_obj.id, user_id=user_obj.id,
+                       latitude=0.5, longitude=1.5) for _ in range(2)]
+        storage.bulk_new(added)
+        self.assertEqual(tiles()[0][:2], (3, other.price_by_night / 3))
+        storage.bulk_update(Place, {added[0].id: {"longitude": 100.0}})
+        storage.bulk_delete(Place, [other.id])
+        self.assertEqual(tiles(), [(1, 0, added[1].id)])
+        self.assertEqual([c["count"] for c in storage.clusters(box, 0)],
+                         [len([p for p in storage.all(Place).values()
+                               if p.latitude is not None])])
+        tables = models.base_model.Base.metadata.tables
+        with storage._DBStorage__engine.begin() as conn:
+            conn.execute(tables["place_tiles"].delete())
+            conn.execute(tables["storage_markers"].delete())
+        storage.close()
+        storage.reload()
+        late = Place(name="late", city_id=city_obj.id, user_id=user_obj.id,
+                     latitude=0.5, longitude=1.6)
+        late.save()
+        self.assertEqual(tiles(), [])
+        storage.migrate()
+        self.assertEqual(tiles(), [(2, 0, min(added[1].id, late.id))])
+        storage.bulk_delete(Place, [places[2].id, late.id] +
+                            [p.id for p in added])
+        for cls, obj in [(City, city_obj), (User, user_obj),
+                         (State, state_obj)]:
+            storage.bulk_delete(cls, [obj.id])
+
+    @unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') != 'db',
+                     "not testing db storage")
+    def test_query_stats(self):
+        """Test that the statements run since close() are counted"""
+        models.storage.close()
+        self.assertEqual(models.storage.query_stats()["queries"], 0)
+        models.storage.count(State)
+        models.storage.count(City)
+        stats = models.storage.query_stats()
+        self.assertEqual(stats["queries"], 2)
+        self.assertEqual(len(stats["slowest"]), 2)
+        self.assertIn("count", stats["slowest"][0]["statement"])
+        self.assertGreaterEqual(stats["time_ms"],
+                                stats["slowest"][0]["time_ms"])
+        with mock.patch.object(DBStorage, "_DBStorage__slow_query", 0):
+            with self.assertLogs("hbnb.slow_query") as logs:
+                models.storage.count(State)
+        self.assertIn("count", json.loads(logs.output[0].split(":", 2)[2])
+                      ["statement"])
+
+    @unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') != 'db',
+                     "not testing db storage")
+    def test_search_places(self):
+        """Test that search_places filters on location and amenities"""
+        state_obj = State(name="Kisii")
+        state_obj.save()
+        city_obj = City(name="Ogembo", state_id=state_obj.id)
+        city_obj.save()
+        user_obj = User(email="sp@gmail.com", password="pwd")
+        user_obj.save()
+        wifi = Amenity(name="Wifi")
+        wifi.save()
+        places = [Place(name=str(i), city_id=city_obj.id,
+                        user_id=user_obj.id) for i in range(2)]
+        places[1].amenities.append(wifi)
+        for place in places:
+            place.save()
+        search = models.storage.search_places
+        self.assertEqual([p.id for p in search(states=[state_obj.id])],
+                         sorted(p.id for p in places))
+        self.assertEqual(search(cities=[city_obj.id], amenities=[wifi.id]),
+                         [places[1]])
+        self.assertEqual(search(states=[state_obj.id],
+                                amenities=[wifi.id, "Timi"]), [])
+        places[0].amenities.append(wifi)
+        places[0].save()
+        found = search(states=[state_obj.id], cities=["Timi"],
+                       amenities=[wifi.id], limit=1, offset=1)
+        self.assertEqual([p.id for p in found], [max(p.id for p in places)])
+        places[0].price_by_night = 80
+        places[1].price_by_night = 20
+        places[0].save()
+        places[1].save()
+        city = [city_obj.id]
+        self.assertEqual(search(cities=city,
+                                ranges={"price_by_night": (50, None)}),
+                         [places[0]])
+        self.assertEqual(search(cities=city, order_by="price_by_night"),
+                         [places[1], places[0]])
+        self.assertEqual(search(cities=city, order_by="-price_by_night",
+                                limit=1), [places[0]])
+
+    @unittest.skipIf(models.storage_t != 'db', "not testing db storage")
+    def test_search_places_geo(self):
+        """Test that search_places filters on boxes and circles and finds
+        the nearest places"""
+        state_obj = State(name="Narok")
+        state_obj.save()
+        city_obj = City(name="Talek", state_id=state_obj.id)
+        city_obj.save()
+        user_obj = User(email="geo@gmail.com", password="pwd")
+        user_obj.save()
+        places = [Place(name=str(i), city_id=city_obj.id, user_id=user_obj.id,
+                        latitude=-1.5, longitude=longitude)
+                  for i, longitude in enumerate([179.9, 35.0, 35.1, 36.0,
+                                                 -179.9])]
+        for place in places:
+            place.save()
+        search = models.storage.search_places
+        city = [city_obj.id]
+
+        def names(found):
+            """Return the names of the places found"""
+            return sorted(p.name for p in found)
+        self.assertEqual(names(search(cities=city, bbox=(34.5, -2, 36.5, -1))),
+                         ["1", "2", "3"])
+        self.assertEqual(names(search(cities=city, bbox=(179, -2, -179, -1))),
+                         ["0", "4"])
+        self.assertEqual(names(search(cities=city, radius=(-1.5, 35.0, 20))),
+                         ["1", "2"])
+        self.assertEqual(names(search(cities=city,
+                                      radius=(-1.5, 180.0, 20))), ["0", "4"])
+        found = search(cities=city, nearest=(places[1].id, 2))
+        self.assertEqual([p.name for p in found], ["2", "3"])
+        found = search(cities=city, nearest=(places[0].id, 1))
+        self.assertEqual([p.name for p in found], ["4"])
+
+
+@unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') != 'db',
+                 "not testing db storage")
+class TestDBStorageReplicas(unittest.TestCase):
+    """Test the read replica routing of DBStorage with SQLite files"""
+
+    def setUp(self):
+        """Create a storage with a primary and a replica database"""
+        self.directory = tempfile.TemporaryDirectory()
+        urls = ["sqlite:///" + os.path.join(self.directory.name, name)
+                for name in ["primary.db", "replica.db"]]
+        env = {"HBNB_DB_URL": urls[0], "HBNB_DB_REPLICA_URLS": urls[1],
+               "HBNB_ENV": ""}
+        with mock.patch.dict(os.environ, env):
+            self.storage = DBStorage()
+        models.base_model.Base.metadata.create_all(create_engine(urls[1]))
+        self.storage.reload()
+
+    def tearDown(self):
+        """Remove the databases"""
+        self.storage.close()
+        self.directory.cleanup()
+
+    def test_routing(self):
+        """Test that reads go to the replica until the session writes"""
+        state = State(name="Kisii")
+        self.storage.new(state)
+        self.storage.save()
+        self.assertEqual(self.storage.count(State), 1)
+        self.storage.close()
+        self.assertEqual(self.storage.count(State), 0)
+        self.assertIsNone(self.storage.get(State, state.id))
+        self.storage.bulk_new([State(name="Nyeri")])
+        self.assertEqual(self.storage.count(State), 2)
+        self.assertEqual(len(self.storage.pool_stats()["replicas"]), 1)
+
+
+@unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') != 'db',
+                 "not testing db storage")
+class TestDBStorageCacheReplicas(unittest.TestCase):
+    """Test the object cache of DBStorage in front of a replica that
+    never catches up"""
+
+    def setUp(self):
+        """Create a storage with a primary, a replica and the cache"""
+        self.directory = tempfile.TemporaryDirectory()
+        urls = ["sqlite:///" + os.path.join(self.directory.name, name)
+                for name in ["primary.db", "replica.db"]]
+        env = {"HBNB_DB_URL": urls[0], "HBNB_DB_REPLICA_URLS": urls[1],
+               "HBNB_DB_CACHE_BYTES": "100000", "HBNB_ENV": ""}
+        with mock.patch.dict(os.environ, env):
+            self.storage = DBStorage()
+        models.base_model.Base.metadata.create_all(create_engine(urls[1]))
+        self.storage.reload()
+
+    def tearDown(self):
+        """Remove the databases"""
+        self.storage.close()
+        self.directory.cleanup()
+
+    def test_no_replica_rows(self):
+        """Test that the cache is filled from the primary only, so that
+        it never serves the rows a replica lags behind on"""
+        state = State(name="Kisii")
+        self.storage.new(state)
+        self.storage.save()
+        self.storage.close()
+        self.assertEqual(len(self.storage.all(State)), 1)
+        self.assertEqual(self.storage.get(State, state.id).name, "Kisii")
+        self.storage.close()
+        cached = self.storage.get(State, state.id)
+        self.assertEqual(cached.name, "Kisii")
+        self.assertEqual(self.storage.cache_stats()["hits"], 1)
+        cached.name = "Nyeri"
+        self.storage.save()
+        self.storage.new(State(name="Meru"))
+        self.storage.save()
+        self.storage.close()
+        self.assertEqual(self.storage.get(State, state.id).name, "Nyeri")
+        self.assertEqual(len(self.storage.all(State)), 2)
+        self.storage.close()
+        self.assertEqual(len(self.storage.all(State)), 2)
+
+
+@unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') != 'db',
+                 "not testing db storage")
+class TestDBStorageCache(unittest.TestCase):
+    """Test the object cache of DBStorage with a SQLite file"""
+
+    def setUp(self):
+        """Create a storage with the object cache enabled"""
+        self.directory = tempfile.TemporaryDirectory()
+        url = "sqlite:///" + os.path.join(self.directory.name, "cache.db")
+        env = {"HBNB_DB_URL": url, "HBNB_DB_REPLICA_URLS": "",
+               "HBNB_DB_CACHE_BYTES": "100000", "HBNB_ENV": ""}
+        with mock.patch.dict(os.environ, env):
+            self.storage = DBStorage()
+        self.storage.reload()
+        self.state = State(name="Kisii")
+        self.storage.new(self.state)
+        self.storage.save()
+        self.storage.close()
+
+    def tearDown(self):
+        """Remove the database"""
+        self.storage.close()
+        self.directory.cleanup()
+
+    def test_hits(self):
+        """Test that get and all are served from the cache across sessions
+        and that the objects can still be updated"""
+        state = self.storage.get(State, self.state.id)
+        self.assertEqual(len(self.storage.all(State)), 1)
+        self.storage.close()
+        cached = self.storage.get(State, self.state.id)
+        self.assertIsNot(cached, state)
+        self.assertEqual(cached.name, "Kisii")
+        self.assertEqual(len(self.storage.all(State)), 1)
+        self.assertEqual(self.storage.cache_stats()["hits"], 2)
+        cached.name = "Nyeri"
+        self.storage.save()
+        self.storage.close()
+        self.assertEqual(self.storage.get(State, self.state.id).name,
+                         "Nyeri")
+
+    def test_invalidation(self):
+        """Test that new, delete and the bulk operations invalidate"""
+        self.assertEqual(len(self.storage.all(State)), 1)
+        self.storage.close()
+        self.storage.new(State(name="Nyeri"))
+        self.storage.save()
+        self.storage.close()
+        self.assertEqual(len(self.storage.all(State)), 2)
+        self.storage.close()
+        self.storage.bulk_update(State, {self.state.id: {"name": "Meru"}})
+        self.storage.close()
+        self.assertEqual(self.storage.get(State, self.state.id).name, "Meru")
+        self.storage.close()
+        self.storage.delete(self.storage.get(State, self.state.id))
+        self.storage.save()
+        self.storage.close()
+        self.assertIsNone(self.storage.get(State, self.state.id))
+        self.assertEqual(len(self.storage.all(State)), 1)
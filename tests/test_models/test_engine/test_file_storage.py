@@ -136,3 +136,672 @@ class TestFileStorage(unittest.TestCase):
         state_obj.save()
         self.assertEqual(storage.count(), initial_len + 1)
         self.assertEqual(storage.count("State"), state_len + 1)
+
+    @unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+    def test_all_cls_uses_partition(self):
+        """Test that all(cls) only returns objects of that class"""
+        storage = FileStorage()
+        state = State()
+        city = City()
+        storage.new(state)
+        storage.new(city)
+        states = storage.all(State)
+        self.assertIn("State." + state.id, states)
+        self.assertNotIn("City." + city.id, states)
+        self.assertEqual(states, storage.all("State"))
+        for value in states.values():
+            self.assertIs(type(value), State)
+        states.clear()
+        self.assertIs(storage.get(State, state.id), state)
+        storage.delete(state)
+        storage.delete(city)
+
+    @unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+    def test_delete_updates_partition(self):
+        """Test that delete removes the obj from get, all and count"""
+        storage = FileStorage()
+        amenity = Amenity()
+        storage.new(amenity)
+        count = storage.count(Amenity)
+        self.assertIs(storage.get("Amenity", amenity.id), amenity)
+        storage.delete(amenity)
+        self.assertIsNone(storage.get(Amenity, amenity.id))
+        self.assertNotIn("Amenity." + amenity.id, storage.all(Amenity))
+        self.assertNotIn("Amenity." + amenity.id, storage.all())
+        self.assertEqual(storage.count(Amenity), count - 1)
+
+    @unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+    def test_related_follows_foreign_keys(self):
+        """Test that the reverse indexes follow new, setattr and delete"""
+        storage = FileStorage()
+        state = State()
+        other = State()
+        city = City(state_id=state.id)
+        storage.new(state)
+        storage.new(other)
+        storage.new(city)
+        self.assertEqual(storage.related(City, "state_id", state.id), [city])
+        self.assertEqual(state.cities, [city])
+        city.state_id = other.id
+        self.assertEqual(state.cities, [])
+        self.assertEqual(other.cities, [city])
+        storage.delete(city)
+        self.assertEqual(other.cities, [])
+        storage.delete(state)
+        storage.delete(other)
+
+    @unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+    def test_related_place_user_review(self):
+        """Test the city, place and user relationship getters"""
+        storage = FileStorage()
+        user = User()
+        city = City()
+        place = Place(city_id=city.id, user_id=user.id)
+        review = Review(place_id=place.id, user_id=user.id)
+        for obj in [user, city, place, review]:
+            storage.new(obj)
+        self.assertEqual(city.places, [place])
+        self.assertEqual(user.places, [place])
+        self.assertEqual(place.reviews, [review])
+        self.assertEqual(user.reviews, [review])
+        for obj in [user, city, place, review]:
+            storage.delete(obj)
+        self.assertEqual(city.places, [])
+        self.assertEqual(user.reviews, [])
+
+    @unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+    def test_get_many(self):
+        """Test that get_many returns the existing objects by key"""
+        storage = FileStorage()
+        state = State()
+        storage.new(state)
+        found = storage.get_many(State, [state.id, "Timi"])
+        self.assertEqual(found, {"State." + state.id: state})
+        self.assertEqual(storage.get_many("Timi", [state.id]), {})
+        storage.delete(state)
+
+    @unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+    def test_counts(self):
+        """Test that counts returns the count of each class by name"""
+        storage = FileStorage()
+        counts = storage.counts([State, "City", "Timi"])
+        self.assertEqual(counts, {"State": storage.count(State),
+                                  "City": storage.count(City),
+                                  "Timi": 0})
+        self.assertEqual(sum(storage.counts().values()), storage.count())
+
+
+class FileStorageScratchTest(unittest.TestCase):
+    """Base class running FileStorage against a scratch file"""
+    attrs = ["file_path", "journal_path", "journal", "journal_limit",
+             "objects", "partitions", "indexes", "indexed", "changes",
+             "group_commit", "snapshot", "journal_pos", "versions", "lazy",
+             "raw", "ordered", "ranked", "grid", "located", "tiles",
+             "tiled"]
+
+    journal = False
+
+    def setUp(self):
+        """Switch FileStorage to a scratch file"""
+        self.saved = {}
+        for attr in self.attrs:
+            name = "_FileStorage__" + attr
+            self.saved[name] = getattr(FileStorage, name)
+        FileStorage._FileStorage__file_path = "test_journal.json"
+        FileStorage._FileStorage__journal_path = "test_journal.json.journal"
+        FileStorage._FileStorage__journal = self.journal
+        self.storage = FileStorage()
+        self.forget()
+
+    def tearDown(self):
+        """Restore FileStorage and remove the scratch files"""
+        self.storage.flush()
+        for name, value in self.saved.items():
+            setattr(FileStorage, name, value)
+        for path in ["test_journal.json", "test_journal.json.journal"]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def forget(self):
+        """Drop every object held in memory, as in a new process"""
+        for attr in ["objects", "partitions", "indexes", "indexed",
+                     "changes", "versions", "raw", "ordered", "ranked",
+                     "grid", "located", "tiles", "tiled"]:
+            setattr(FileStorage, "_FileStorage__" + attr, {})
+        FileStorage._FileStorage__snapshot = None
+        FileStorage._FileStorage__journal_pos = (None, 0)
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageBulk(FileStorageScratchTest):
+    """Test the bulk operations of FileStorage"""
+    journal = True
+
+    def records(self):
+        """Return the records appended to the journal"""
+        with open("test_journal.json.journal") as f:
+            return [json.loads(line) for line in f]
+
+    def test_bulk_new(self):
+        """Test that bulk_new stores the objects in one write"""
+        states = [State(name=str(i)) for i in range(3)]
+        self.storage.bulk_new(states)
+        self.assertEqual(self.storage.count(State), 3)
+        self.assertEqual(len(self.records()), 3)
+
+    def test_bulk_update_and_delete(self):
+        """Test that bulk_update and bulk_delete only touch given ids"""
+        states = [State(name=str(i)) for i in range(3)]
+        self.storage.bulk_new(states)
+        count = self.storage.bulk_update(State, {
+            states[0].id: {"name": "Nairobi", "id": "Timi"},
+            "Timi": {"name": "Kisumu"}})
+        self.assertEqual(count, 1)
+        self.assertEqual(states[0].name, "Nairobi")
+        self.assertNotEqual(states[0].updated_at, states[0].created_at)
+        self.assertEqual(self.storage.bulk_delete(State, [states[1].id,
+                                                          "Timi"]), 1)
+        self.assertIsNone(self.storage.get(State, states[1].id))
+        self.assertEqual([r["op"] for r in self.records()[3:]],
+                         ["put", "delete"])
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageFind(FileStorageScratchTest):
+    """Test the queries of FileStorage"""
+
+    def setUp(self):
+        """Store a few places in two cities"""
+        super().setUp()
+        self.places = []
+        for i, price in enumerate([30, 10, 50, 20, None]):
+            place = Place(name=str(i), price_by_night=price,
+                          city_id="Kisii" if i % 2 else "Nyeri")
+            self.storage.new(place)
+            self.places.append(place)
+
+    def names(self, places):
+        """Return the names of places"""
+        return [place.name for place in places]
+
+    def test_filters(self):
+        """Test equality, __in and range filters"""
+        find = self.storage.find
+        self.assertCountEqual(self.names(find(Place, {"city_id": "Kisii"})),
+                              ["1", "3"])
+        self.assertEqual(find(Place, {"city_id": "Timi"}), [])
+        self.assertCountEqual(self.names(find(Place, {
+            "city_id__in": ["Kisii", "Nyeri"],
+            "price_by_night__gte": 20, "price_by_night__lt": 50})),
+            ["0", "3"])
+        self.assertEqual(self.names(find(Place, {"name": "4"})), ["4"])
+        self.places[1].city_id = "Nyeri"
+        self.assertEqual(self.names(find(Place, {"city_id": "Kisii"})),
+                         ["3"])
+
+    def test_order_and_limit(self):
+        """Test order_by, limit and offset"""
+        find = self.storage.find
+        self.assertEqual(self.names(find(Place, order_by="price_by_night")),
+                         ["1", "3", "0", "2", "4"])
+        self.assertEqual(self.names(find(Place, order_by="-price_by_night",
+                                         limit=2, offset=1)),
+                         ["0", "3"])
+        self.assertEqual(self.names(find(Place, order_by=[
+            "city_id", "-price_by_night"])), ["3", "1", "2", "0", "4"])
+        self.assertEqual(len(find(Place, limit=2, offset=4)), 1)
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageSearch(FileStorageScratchTest):
+    """Test the places search of FileStorage"""
+
+    def setUp(self):
+        """Store places in three cities of two states with amenities"""
+        super().setUp()
+        self.states = [State(name=str(i)) for i in range(2)]
+        self.cities = [City(name=str(i), state_id=self.states[i // 2].id)
+                       for i in range(3)]
+        self.amenities = [Amenity(name=str(i)) for i in range(2)]
+        self.places = []
+        for i in range(6):
+            amenity_ids = [a.id for a in self.amenities[:i % 3]]
+            self.places.append(Place(name=str(i), amenity_ids=amenity_ids,
+                                     city_id=self.cities[i % 3].id))
+        for obj in self.states + self.cities + self.amenities + self.places:
+            self.storage.new(obj)
+
+    def search(self, **kwargs):
+        """Return the names of the places found"""
+        return sorted(p.name for p in self.storage.search_places(**kwargs))
+
+    def test_locations(self):
+        """Test that states and cities select the places they hold"""
+        self.assertEqual(self.search(), ["0", "1", "2", "3", "4", "5"])
+        self.assertEqual(self.search(states=[self.states[1].id]), ["2", "5"])
+        self.assertEqual(self.search(states=[self.states[1].id],
+                                     cities=[self.cities[0].id]),
+                         ["0", "2", "3", "5"])
+        self.assertEqual(self.search(cities=["Timi"]), [])
+
+    def test_amenities(self):
+        """Test that every amenity has to be present"""
+        ids = [a.id for a in self.amenities]
+        self.assertEqual(self.search(amenities=ids[:1]), ["1", "2", "4", "5"])
+        self.assertEqual(self.search(amenities=ids), ["2", "5"])
+        self.assertEqual(self.search(states=[self.states[0].id],
+                                     amenities=ids[:1]), ["1", "4"])
+        self.assertEqual(self.search(amenities=ids + ["Timi"]), [])
+        self.places[0].amenity_ids = ids
+        self.places[5].amenity_ids = []
+        self.assertEqual(self.search(amenities=ids), ["0", "2"])
+        self.storage.delete(self.places[2])
+        self.assertEqual(self.search(amenities=ids), ["0"])
+
+    def test_pagination(self):
+        """Test that the places are sorted by id and sliced"""
+        ids = sorted(p.id for p in self.places)
+        found = self.storage.search_places(limit=2, offset=3)
+        self.assertEqual([p.id for p in found], ids[3:5])
+        found = self.storage.search_places(states=[self.states[0].id],
+                                           offset=3)
+        self.assertEqual(len(found), 1)
+
+    def prices(self, **kwargs):
+        """Return the names of the places found, in order"""
+        return [p.name for p in self.storage.search_places(**kwargs)]
+
+    def test_ranges(self):
+        """Test that numeric ranges are answered from the sorted indexes
+        and follow updates and deletions"""
+        for place, price in zip(self.places, [50, 10, 30, 10, 40, "x"]):
+            place.price_by_night = price
+        self.places[1].max_guest = 4
+        self.places[2].max_guest = 2
+        price = {"price_by_night": (10, 40)}
+        self.assertEqual(self.search(ranges=price), ["1", "2", "3", "4"])
+        self.assertEqual(self.search(ranges={"price_by_night": (None, 29)}),
+                         ["1", "3"])
+        self.assertEqual(self.search(ranges=dict(price, max_guest=(3, None)),
+                                     amenities=[self.amenities[0].id]),
+                         ["1"])
+        self.places[4].price_by_night = 41
+        self.storage.delete(self.places[1])
+        self.assertEqual(self.search(ranges=price), ["2", "3"])
+
+    def test_order_by(self):
+        """Test that places are sorted by a numeric attribute then by id,
+        missing values last, with or without other filters"""
+        for place, price in zip(self.places, [50, 10, 30, 10, 40, "x"]):
+            place.price_by_night = price
+        first, second = sorted([self.places[1], self.places[3]],
+                               key=lambda p: p.id)
+        low = [first.name, second.name]
+        self.assertEqual(self.prices(order_by="price_by_night"),
+                         low + ["2", "4", "0", "5"])
+        self.assertEqual(self.prices(order_by="-price_by_night"),
+                         ["0", "4", "2"] + low[::-1] + ["5"])
+        self.assertEqual(self.prices(order_by="price_by_night", limit=2,
+                                     offset=2), ["2", "4"])
+        state = [self.states[0].id]
+        self.assertEqual(self.prices(states=state, order_by="price_by_night"),
+                         low + ["4", "0"])
+        self.assertEqual(self.prices(states=state, order_by="-price_by_night",
+                                     limit=1), ["0"])
+
+    def locate(self):
+        """Spread the places along the equator, 0 and 5 across the
+        antimeridian"""
+        for place, longitude in zip(self.places,
+                                    [179.9, 1.0, 1.1, 2.0, 30.0, -179.9]):
+            place.latitude = 0.5
+            place.longitude = longitude
+
+    def test_bbox_radius(self):
+        """Test that boxes and circles select the places inside them and
+        follow moves and deletions"""
+        self.locate()
+        self.assertEqual(self.search(bbox=(0.5, 0, 2.5, 1)), ["1", "2", "3"])
+        self.assertEqual(self.search(bbox=(179, 0, -179, 1)), ["0", "5"])
+        self.assertEqual(self.search(radius=(0.5, 1.0, 20)), ["1", "2"])
+        self.assertEqual(self.search(radius=(0.5, 180.0, 20),
+                                     amenities=[self.amenities[0].id]),
+                         ["5"])
+        self.assertEqual(self.search(radius=(0.5, 1.0, 5000)),
+                         ["1", "2", "3", "4"])
+        self.places[4].longitude = 1.05
+        self.places[4].latitude = "x"
+        self.storage.delete(self.places[1])
+        self.assertEqual(self.search(bbox=(0.5, 0, 2.5, 1)), ["2", "3"])
+        self.places[4].latitude = 0.5
+        self.assertEqual(self.search(radius=(0.5, 1.0, 20)), ["2", "4"])
+
+    def test_no_coordinates(self):
+        """Test that places without coordinates of their own are not
+        located at the 0.0 class defaults, before or after a reload"""
+        self.places[0].latitude = 0.005
+        self.places[0].longitude = 0.005
+        self.storage.save()
+        for reload in (False, True):
+            if reload:
+                self.forget()
+                self.storage.reload()
+            self.assertEqual(self.search(radius=(0.01, 0.01, 5)), ["0"])
+            self.assertEqual(self.search(bbox=(-1, -1, 1, 1)), ["0"])
+            self.assertEqual(self.prices(nearest=(self.places[0].id, 5)), [])
+
+    def test_nearest(self):
+        """Test that the k places closest to a place come sorted by
+        distance, excluding the place itself"""
+        self.locate()
+        nearest = (self.places[1].id, 3)
+        self.assertEqual(self.prices(nearest=nearest), ["2", "3", "4"])
+        self.assertEqual(self.prices(nearest=nearest, offset=1), ["3", "4"])
+        self.assertEqual(self.prices(nearest=(self.places[0].id, 1)), ["5"])
+        self.assertEqual(self.prices(nearest=nearest,
+                                     states=[self.states[1].id]), ["2", "5"])
+        self.assertEqual(self.prices(nearest=("Timi", 3)), [])
+
+    def test_clusters(self):
+        """Test that the tile aggregates follow price changes, moves and
+        deletions, leaving out the places without coordinates"""
+        world = (-180, -90, 180, 90)
+        self.assertEqual(self.storage.clusters(world, 0), [])
+        self.locate()
+        for place, price in zip(self.places[1:5], [10, 20, 30, "x"]):
+            place.price_by_night = price
+        self.storage.new(Place(name="nowhere", price_by_night=1000))
+        found = self.storage.clusters(world, 0)
+        self.assertEqual([(c["count"], c["average_price"]) for c in found],
+                         [(6, 12)])
+        self.assertEqual(found[0]["place_id"], min(p.id for p in self.places))
+        found = self.storage.clusters(world, 2)
+        self.assertEqual([(c["bbox"], c["count"]) for c in found],
+                         [([-180, 0, -90, 90], 1), ([0, 0, 90, 90], 4),
+                          ([90, 0, 180, 90], 1)])
+        self.assertEqual(found[1]["average_price"], 20)
+        self.assertEqual(found[1]["place_id"],
+                         min(p.id for p in self.places[1:5]))
+        middle = sorted(self.places[1:4], key=lambda p: p.id)
+        self.storage.delete(middle[0])
+        self.places[4].longitude = -179.85
+        found = self.storage.clusters((0, 0, 10, 1), 2)
+        self.assertEqual([c["count"] for c in found], [2])
+        self.assertEqual(found[0]["place_id"], middle[1].id)
+        found = self.storage.clusters((170, 0, -170, 1), 20)
+        self.assertEqual([c["count"] for c in found], [2, 1])
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageJournal(FileStorageScratchTest):
+    """Test the journal persistence mode of FileStorage"""
+    journal = True
+
+    def test_save_appends_changes(self):
+        """Test that save appends one record per changed object"""
+        state = State(name="Nairobi")
+        state.save()
+        city = City(name="Kisumu", state_id=state.id)
+        city.save()
+        self.assertFalse(os.path.exists("test_journal.json"))
+        with open("test_journal.json.journal") as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual([r["key"] for r in records],
+                         ["State." + state.id, "City." + city.id])
+        self.assertEqual(records[1]["obj"], city.to_dict())
+
+    def test_reload_replays_journal(self):
+        """Test that reload rebuilds objects from snapshot and journal"""
+        state = State(name="Nairobi")
+        state.save()
+        self.storage.compact()
+        city = City(name="Kisumu", state_id=state.id)
+        city.save()
+        state.name = "Mombasa"
+        state.save()
+        self.storage.delete(city)
+        self.storage.save()
+        self.forget()
+        self.storage.reload()
+        self.assertEqual(self.storage.get(State, state.id).name, "Mombasa")
+        self.assertIsNone(self.storage.get(City, city.id))
+        self.assertEqual(self.storage.get(State, state.id).cities, [])
+
+    def test_compaction(self):
+        """Test that the journal is folded into the snapshot past its limit"""
+        FileStorage._FileStorage__journal_limit = 1
+        state = State(name="Nairobi")
+        state.save()
+        self.assertFalse(os.path.exists("test_journal.json.journal"))
+        with open("test_journal.json") as f:
+            self.assertIn("State." + state.id, json.load(f))
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageGroupCommit(FileStorageScratchTest):
+    """Test the group commit of FileStorage saves"""
+
+    def test_request_group_commit(self):
+        """Test that saves are only written by close()"""
+        FileStorage._FileStorage__group_commit = "request"
+        state = State(name="Nairobi")
+        state.save()
+        City(name="Kisumu", state_id=state.id).save()
+        self.assertFalse(os.path.exists("test_journal.json"))
+        self.storage.close()
+        with open("test_journal.json") as f:
+            self.assertEqual(len(json.load(f)), 2)
+        self.assertIs(self.storage.get(State, state.id), state)
+
+    def test_window_group_commit(self):
+        """Test that saves within the window are written together"""
+        FileStorage._FileStorage__group_commit = "0.05"
+        state = State(name="Nairobi")
+        state.save()
+        timer = FileStorage._FileStorage__timer
+        city = City(name="Kisumu", state_id=state.id)
+        city.save()
+        self.assertIs(FileStorage._FileStorage__timer, timer)
+        self.assertFalse(os.path.exists("test_journal.json"))
+        timer.join()
+        with open("test_journal.json") as f:
+            self.assertIn("City." + city.id, json.load(f))
+
+    def test_window_spans_requests(self):
+        """Test that close() leaves the saves to the window, and that
+        reload keeps the objects whose changes are still pending"""
+        FileStorage._FileStorage__group_commit = "60"
+        state = State(name="Nairobi")
+        state.save()
+        self.storage.close()
+        state.name = "Kisumu"
+        state.save()
+        self.storage.close()
+        self.assertFalse(os.path.exists("test_journal.json"))
+        record = dict(state.to_dict(), name="Mombasa",
+                      updated_at=datetime.utcnow().isoformat())
+        with open("test_journal.json", "w") as f:
+            json.dump({"State." + state.id: record}, f)
+        self.storage.close()
+        self.assertIs(self.storage.get(State, state.id), state)
+        self.assertEqual(state.name, "Kisumu")
+        self.storage.flush()
+        with open("test_journal.json") as f:
+            self.assertEqual(json.load(f)["State." + state.id]["name"],
+                             "Kisumu")
+
+    def test_flush(self):
+        """Test that flush writes the pending saves right away"""
+        FileStorage._FileStorage__group_commit = "60"
+        state = State(name="Nairobi")
+        state.save()
+        self.storage.flush()
+        self.assertIsNone(FileStorage._FileStorage__timer)
+        with open("test_journal.json") as f:
+            self.assertIn("State." + state.id, json.load(f))
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageReload(FileStorageScratchTest):
+    """Test that reload only does the work the file changes call for"""
+
+    def write_snapshot(self, records):
+        """Rewrite the JSON file as another process would"""
+        with open("test_journal.json", "w") as f:
+            json.dump(records, f)
+
+    def test_unchanged_file_is_not_read(self):
+        """Test that reload keeps the objects when the file is unchanged"""
+        state = State(name="Nairobi")
+        state.save()
+        state.name = "Unsaved"
+        self.storage.reload()
+        self.assertIs(self.storage.get(State, state.id), state)
+        self.assertEqual(state.name, "Unsaved")
+
+    def test_changed_file_is_merged(self):
+        """Test that reload only rebuilds the records that changed"""
+        state = State(name="Nairobi")
+        state.save()
+        other = State(name="Kisumu")
+        other.save()
+        city = City(name="Kisii", state_id=state.id)
+        city.save()
+        with open("test_journal.json") as f:
+            records = json.load(f)
+        records["State." + other.id]["name"] = "Mombasa"
+        records["State." + other.id]["updated_at"] = \
+            datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%f")
+        del records["City." + city.id]
+        new_state = State(name="Nakuru")
+        records["State." + new_state.id] = new_state.to_dict()
+        self.write_snapshot(records)
+        self.storage.reload()
+        self.assertIs(self.storage.get(State, state.id), state)
+        self.assertEqual(self.storage.get(State, other.id).name, "Mombasa")
+        self.assertIsNone(self.storage.get(City, city.id))
+        self.assertEqual(state.cities, [])
+        self.assertEqual(self.storage.get(State, new_state.id).name,
+                         "Nakuru")
+
+    def test_unreadable_file_drops_nothing(self):
+        """Test that reload keeps the objects when the file is corrupted,
+        and that the next save writes them all back"""
+        states = [State(name=str(i)) for i in range(3)]
+        for state in states:
+            state.save()
+        with open("test_journal.json", "a") as f:
+            f.write("x")
+        self.storage.close()
+        self.assertEqual(self.storage.count(State), 3)
+        State(name="3").save()
+        self.assertEqual(self.storage.count(State), 4)
+        with open("test_journal.json") as f:
+            self.assertEqual(len(json.load(f)), 4)
+
+    def test_journal_tail_is_replayed(self):
+        """Test that reload only replays the journal records it lacks"""
+        FileStorage._FileStorage__journal = True
+        state = State(name="Nairobi")
+        state.save()
+        city = City(name="Kisii", state_id=state.id)
+        with open("test_journal.json.journal", "a") as f:
+            f.write(json.dumps({"op": "put", "key": "City." + city.id,
+                                "obj": city.to_dict()}) + "\n")
+            f.write('{"op": "delete", "key": ')
+        self.storage.reload()
+        self.assertIs(self.storage.get(State, state.id), state)
+        self.assertEqual(len(state.cities), 1)
+        with open("test_journal.json.journal", "a") as f:
+            f.write('"State.{}"}}\n'.format(state.id))
+        self.storage.reload()
+        self.assertIsNone(self.storage.get(State, state.id))
+
+    def test_sorted_indexes(self):
+        """Test that the sorted indexes built by reload, at once or one
+        record at a time, keep places in order, each of them once"""
+        places = [Place(name=str(i), price_by_night=(i * 7) % 10)
+                  for i in range(20)]
+        places[3].price_by_night = None
+        self.storage.bulk_new(places)
+        expected = [p.id for p in sorted(
+            places[:3] + places[4:], key=lambda p: (p.price_by_night, p.id))]
+        for lazy in (False, True):
+            self.forget()
+            FileStorage._FileStorage__lazy = lazy
+            self.storage.reload()
+            self.storage.get(Place, places[5].id)
+            found = self.storage.search_places(order_by="price_by_night")
+            self.assertEqual([p.id for p in found],
+                             expected + [places[3].id])
+        with open("test_journal.json") as f:
+            records = json.load(f)
+        records["Place." + places[0].id]["price_by_night"] = 100
+        records["Place." + places[0].id]["updated_at"] = \
+            datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%f")
+        self.write_snapshot(records)
+        self.storage.reload()
+        found = self.storage.search_places(ranges={"price_by_night": (50,
+                                                                      None)})
+        self.assertEqual([p.id for p in found], [places[0].id])
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+class TestFileStorageLazy(FileStorageScratchTest):
+    """Test the lazy materialization mode of FileStorage"""
+
+    def setUp(self):
+        """Store a few objects, then reload them lazily"""
+        super().setUp()
+        self.state = State(name="Nairobi")
+        self.state.save()
+        self.city = City(name="Kisii", state_id=self.state.id)
+        self.city.save()
+        self.amenity = Amenity(name="Wifi")
+        self.amenity.save()
+        self.forget()
+        FileStorage._FileStorage__lazy = True
+        self.storage.reload()
+
+    def built(self):
+        """Return the keys of the objects built so far"""
+        return set(FileStorage._FileStorage__objects)
+
+    def test_reload_builds_nothing(self):
+        """Test that reload keeps records without building objects"""
+        self.assertEqual(self.built(), set())
+        self.assertEqual(self.storage.count(), 3)
+        self.assertEqual(self.storage.count(State), 1)
+
+    def test_access_builds_objects(self):
+        """Test that get, indexes and all build objects on first access"""
+        state = self.storage.get(State, self.state.id)
+        self.assertEqual(state.name, "Nairobi")
+        self.assertIs(self.storage.get(State, self.state.id), state)
+        self.assertEqual(self.built(), {"State." + self.state.id})
+        self.assertEqual([c.name for c in state.cities], ["Kisii"])
+        self.assertEqual(len(self.built()), 2)
+        self.assertEqual(len(self.storage.all(Amenity)), 1)
+        self.assertEqual(len(self.storage.all()), 3)
+
+    def test_save_keeps_records(self):
+        """Test that saving writes the records not built yet unchanged"""
+        self.storage.get(State, self.state.id).save()
+        with open("test_journal.json") as f:
+            records = json.load(f)
+        self.assertEqual(records["City." + self.city.id],
+                         self.city.to_dict())
+        self.storage.delete(self.storage.get(City, self.city.id))
+        self.assertEqual(self.storage.count(City), 0)
+
+    def test_iter(self):
+        """Test that iter yields built and unbuilt objects batch by batch"""
+        state = self.storage.get(State, self.state.id)
+        states = list(self.storage.iter(State, batch_size=1))
+        self.assertEqual(states, [state])
+        objs = list(self.storage.iter(batch_size=2))
+        self.assertEqual(len(objs), 3)
+        self.assertIn(state, objs)
+        self.assertEqual(self.built(), {"{}.{}".format(type(obj).__name__,
+                                                       obj.id)
+                                        for obj in objs})
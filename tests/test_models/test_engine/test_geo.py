@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+"""
+Contains the TestGeoDocs and TestGeo classes
+"""
+
+import inspect
+from models.engine import geo
+import pep8
+import unittest
+
+
+class TestGeoDocs(unittest.TestCase):
+    """Tests to check the documentation and style of the geo module"""
+    def test_pep8_conformance(self):
+        """Test that geo.py and its tests conform to PEP8."""
+        pep8s = pep8.StyleGuide(quiet=True)
+        result = pep8s.check_files([
+            'models/engine/geo.py',
+            'tests/test_models/test_engine/test_geo.py'])
+        self.assertEqual(result.total_errors, 0,
+                         "Found code style errors (and warnings).")
+
+    def test_docstrings(self):
+        """Test for the module and function docstrings"""
+        self.assertTrue(len(geo.__doc__) >= 1)
+        for func in inspect.getmembers(geo, inspect.isfunction):
+            self.assertTrue(len(func[1].__doc__ or "") >= 1,
+                            "{:s} function needs a docstring".format(func[0]))
+
+
+class TestGeo(unittest.TestCase):
+    """Test the great-circle helpers"""
+    def test_coordinates(self):
+        """Test that only numbers of the valid ranges are coordinates"""
+        self.assertEqual(geo.coordinates(-1.5, 36), (-1.5, 36))
+        for latitude, longitude in [(91, 0), (0, -181), (None, 0),
+                                    ("1", 0), (float("nan"), 0)]:
+            self.assertIsNone(geo.coordinates(latitude, longitude))
+
+    def test_distance(self):
+        """Test distances along the equator and a meridian"""
+        self.assertAlmostEqual(geo.distance(0, 0, 0, 1), 111.195, 3)
+        self.assertAlmostEqual(geo.distance(0, 179.5, 0, -179.5), 111.195, 3)
+        self.assertAlmostEqual(geo.distance(-90, 0, 90, 0), 20015.114, 3)
+
+    def test_radius_box(self):
+        """Test that the box holds the circle, split across the
+        antimeridian and spanning every longitude around a pole"""
+        south, north, spans = geo.radius_box(0, 0, 111.195)
+        self.assertAlmostEqual(south, -1, 5)
+        self.assertAlmostEqual(north, 1, 5)
+        self.assertEqual(len(spans), 1)
+        self.assertAlmostEqual(spans[0][1], 1, 5)
+        spans = geo.radius_box(0, 179.5, 111.195)[2]
+        self.assertEqual([round(w, 3) for w, _ in spans], [178.5, -180])
+        self.assertEqual(geo.radius_box(89.5, 0, 100)[1:],
+                         (90, [(-180, 180)]))
+
+    def test_tiles(self):
+        """Test that tiles are found from the south-west corner, that
+        each tile of the path is made of four of the next and that the
+        box of a tile holds its points"""
+        self.assertEqual(geo.tile(0, 90, 180), (0, 0))
+        self.assertEqual(geo.tile(2, 0.5, 1.0), (1, 2))
+        self.assertEqual(geo.tile(2, 90, 180), (1, 3))
+        self.assertEqual(geo.tile_box(2, 1, 2), [0, 0, 90, 90])
+        for latitude, longitude in [(0.5, 1.0), (-90, -180), (90, 180),
+                                    (-1.2345, 36.789)]:
+            path = geo.tile_path(latitude, longitude)
+            self.assertEqual(len(path), geo.MAX_ZOOM + 1)
+            for zoom, row, column in path:
+                self.assertEqual(geo.tile(zoom, latitude, longitude),
+                                 (row, column))
+                west, south, east, north = geo.tile_box(zoom, row, column)
+                self.assertTrue(south <= latitude <= north)
+                self.assertTrue(west <= longitude <= east)
+        rows, columns = geo.tile_ranges(2, 0, 1, [(170, 180), (-180, -170)])
+        self.assertEqual((rows, columns), (range(1, 2),
+                                           [range(3, 4), range(0, 1)]))
@@ -0,0 +1,91 @@
+#!/usr/bin/python3
+"""
+Contains the TestObjectCacheDocs and TestObjectCache classes
+"""
+
+import inspect
+from models.engine import object_cache
+import pep8
+import unittest
+from unittest import mock
+ObjectCache = object_cache.ObjectCache
+
+
+class TestObjectCacheDocs(unittest.TestCase):
+    """Tests to check the documentation and style of ObjectCache class"""
+    @classmethod
+    def setUpClass(cls):
+        """Set up for the doc tests"""
+        cls.oc_f = inspect.getmembers(ObjectCache, inspect.isfunction)
+
+    def test_pep8_conformance(self):
+        """Test that object_cache.py and its tests conform to PEP8."""
+        pep8s = pep8.StyleGuide(quiet=True)
+        result = pep8s.check_files([
+            'models/engine/object_cache.py',
+            'tests/test_models/test_engine/test_object_cache.py'])
+        self.assertEqual(result.total_errors, 0,
+                         "Found code style errors (and warnings).")
+
+    def test_docstrings(self):
+        """Test for the module, class and method docstrings"""
+        self.assertTrue(len(object_cache.__doc__) >= 1)
+        self.assertTrue(len(ObjectCache.__doc__) >= 1)
+        for func in self.oc_f:
+            self.assertTrue(len(func[1].__doc__ or "") >= 1,
+                            "{:s} method needs a docstring".format(func[0]))
+
+
+class TestObjectCache(unittest.TestCase):
+    """Test the ObjectCache class"""
+    def test_get_set(self):
+        """Test that values are returned until invalidated"""
+        cache = ObjectCache(100, 60)
+        self.assertIsNone(cache.get("a"))
+        cache.set("a", 1, 10)
+        self.assertEqual(cache.get("a"), 1)
+        cache.invalidate("a")
+        self.assertIsNone(cache.get("a"))
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 2))
+        self.assertEqual((stats["entries"], stats["bytes"]), (0, 0))
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entries are evicted past
+        max_bytes and that larger values are not cached"""
+        cache = ObjectCache(30, 60)
+        for key in "abc":
+            cache.set(key, key, 10)
+        cache.get("a")
+        cache.set("d", "d", 10)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual([cache.get(key) for key in "acd"], ["a", "c", "d"])
+        cache.set("e", "e", 31)
+        self.assertIsNone(cache.get("e"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertEqual(cache.stats()["bytes"], 30)
+
+    def test_ttl(self):
+        """Test that entries expire after ttl seconds"""
+        cache = ObjectCache(100, 5)
+        with mock.patch.object(object_cache.time, "monotonic",
+                               return_value=100):
+            cache.set("a", 1, 10)
+        with mock.patch.object(object_cache.time, "monotonic",
+                               return_value=104):
+            self.assertEqual(cache.get("a"), 1)
+        with mock.patch.object(object_cache.time, "monotonic",
+                               return_value=105):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["expirations"], 1)
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_generation(self):
+        """Test that values read before an invalidation are not cached"""
+        cache = ObjectCache(100, 60)
+        generation = cache.generation()
+        cache.invalidate("a")
+        cache.set("a", "stale", 10, generation)
+        self.assertIsNone(cache.get("a"))
+        cache.set("a", "fresh", 10, cache.generation())
+        self.assertEqual(cache.get("a"), "fresh")